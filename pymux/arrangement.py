@@ -19,6 +19,7 @@ from pygments.token import Token
 
 import math
 import os
+import time
 import weakref
 import six
 
@@ -60,6 +61,12 @@ class Pane(object):
         # Displayed the clock instead of this pane content.
         self.clock_mode = False
 
+        # Time when this pane was rendered for the last time.
+        self.last_viewed = time.time()
+
+        # True when the process had output while the pane was not visible.
+        self.has_activity = False
+
         # Give unique ID.
         Pane._pane_counter += 1
         self.pane_id = Pane._pane_counter
@@ -72,6 +79,7 @@ class Pane(object):
         self.copy_token_list = []
         self.display_scroll_buffer = False
         self.scroll_buffer_title = ''
+        self._scroll_buffer_line_count = 0
 
         # Search buffer, for use in copy mode. (Each pane gets its own search buffer.)
         self.search_buffer = Buffer()
@@ -80,8 +88,9 @@ class Pane(object):
 
     def enter_copy_mode(self):
         """
-        Suspend the process, and copy the screen content to the `scroll_buffer`.
-        That way the user can search through the history and copy/paste.
+        Copy the screen content to the `scroll_buffer`. That way the user can
+        search through the history and copy/paste. (The process keeps running
+        and its output is still processed.)
         """
         document, token_list = self.process.create_copy_document()
         self._enter_scroll_buffer('Copy', document, token_list)
@@ -96,8 +105,9 @@ class Pane(object):
             token_list=[(Token, text)])
 
     def _enter_scroll_buffer(self, title, document, token_list):
-        # Suspend child process.
-        self.process.suspend()
+        # Remember the amount of lines, in order to display how many lines the
+        # process printed in the meantime.
+        self._scroll_buffer_line_count = self.process.screen.scrolled_line_count
 
         self.scroll_buffer.set_document(document, bypass_readonly=True)
         self.copy_token_list = token_list
@@ -111,9 +121,16 @@ class Pane(object):
         """
         Exit scroll buffer. (Exits help or copy mode.)
         """
-        self.process.resume()
         self.display_scroll_buffer = False
 
+    @property
+    def new_line_count(self):
+        """
+        The amount of lines that the process printed since we entered the
+        scroll buffer. (The lines that scrolled up in the meantime.)
+        """
+        return self.process.screen.scrolled_line_count - self._scroll_buffer_line_count
+
 
 class _WeightsDictionary(weakref.WeakKeyDictionary):
     """
@@ -220,6 +237,9 @@ class Window(object):
         self.zoom = False
         self._active_pane = value
 
+        # The window name is taken from the process in the active pane.
+        value.process.request_metadata_update()
+
     @property
     def previous_active_pane(self):
         """
@@ -588,6 +608,19 @@ class Arrangement(object):
             self._active_window_for_cli[cli] = self._last_active_window or self.windows[0]
             return self.windows[0]
 
+    def pane_is_visible(self, cli, pane):
+        """
+        True when this :class:`.Pane` is displayed to this client.
+        """
+        assert isinstance(pane, Pane)
+
+        window = self.get_active_window(cli)
+
+        if window.zoom:
+            return pane == window.active_pane
+        else:
+            return pane in window.panes
+
     def set_active_window(self, cli, window):
         assert isinstance(cli, CommandLineInterface)
         assert isinstance(window, Window)
@@ -19,6 +19,7 @@ from pymux.key_mappings import pymux_key_to_prompt_toolkit_key_sequence, prompt_
 from pymux.layout import focus_right, focus_left, focus_up, focus_down
 from pymux.log import logger
 from pymux.options import SetOptionError
+from pymux.screen import sgr_cache
 
 __all__ = (
     'call_command_handler',
@@ -635,16 +636,31 @@ def list_panes(pymux, cli, variables):
     for i, p in enumerate(w.panes):
         process = p.process
 
-        result.append('%i: [%sx%s] [history %s/%s] %s\n' % (
+        result.append('%i: [%sx%s] [history %s/%s, %s bytes] %s\n' % (
             i, process.sx, process.sy,
             min(pymux.history_limit, process.screen.line_offset + process.sy),
             pymux.history_limit,
+            process.screen.memory_usage(),
             ('(active)' if p == active_pane else '')))
 
     # Display help in pane.
     active_pane.display_text(''.join(result), title='list-panes')
 
 
+@cmd('show-stats')
+def show_stats(pymux, cli, variables):
+    """
+    Display internal statistics. (Cache efficiency.)
+    """
+    result = [
+        'sgr-cache: %i hits, %i misses, %i/%i entries\n' % (
+            sgr_cache.hits, sgr_cache.misses, len(sgr_cache), sgr_cache.maxsize),
+    ]
+
+    pane = pymux.arrangement.get_active_pane(cli)
+    pane.display_text(''.join(result), title='show-stats')
+
+
 # Check whether all aliases point to real commands.
 for k in ALIASES.values():
     assert k in COMMANDS_TO_HANDLERS
@@ -48,6 +48,10 @@ def format_pymux_string(pymux, cli, string, window=None, pane=None):
     def window_flags():
         z = 'Z' if window.zoom else ''
 
+        # Activity in a pane that was not visible.
+        if any(p.has_activity for p in window.panes):
+            z += '#'
+
         if window == arrangement.get_active_window(cli):
             return '*' + z
         elif window == arrangement.get_previous_active_window(cli):
@@ -24,6 +24,7 @@ from pygments.token import Token
 import pymux.arrangement as arrangement
 import datetime
 import six
+import time
 import weakref
 
 from .enums import COMMAND, PROMPT
@@ -202,6 +203,8 @@ class PaneControl(UIControl):
     def create_screen(self, cli, width, height):
         process = self.process
         process.set_size(width, height)
+        self.pane.last_viewed = time.time()
+        self.pane.has_activity = False
         return process.screen.pt_screen
 
     def has_focus(self, cli):
@@ -768,12 +771,22 @@ def _create_container_for_process(pymux, arrangement_pane, zoom=False):
             result.append((Token.TitleBar.Zoom, ' Z '))
 
         if process.is_terminated:
-            result.append((Token.Terminated, ' Terminated '))
+            if process.exit_status is None:
+                result.append((Token.Terminated, ' Terminated '))
+            elif process.exit_status < 0:
+                result.append((Token.Terminated, ' Terminated (signal %i) ' % -process.exit_status))
+            else:
+                result.append((Token.Terminated, ' Terminated (status %i) ' % process.exit_status))
 
         # Scroll buffer info.
         if arrangement_pane.display_scroll_buffer:
             result.append((token.CopyMode, ' %s ' % arrangement_pane.scroll_buffer_title))
 
+            # Output of the process since entering the scroll buffer.
+            new_line_count = arrangement_pane.new_line_count
+            if new_line_count:
+                result.append((token.CopyMode.NewLines, ' +%i lines ' % new_line_count))
+
             # Cursor position.
             document = arrangement_pane.scroll_buffer.document
             result.append((token.CopyMode.Position, ' %i,%i ' % (
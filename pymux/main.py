@@ -22,9 +22,15 @@ from .enums import COMMAND, PROMPT
 from .key_bindings import KeyBindingsManager
 from .layout import LayoutManager, Justify
 from .log import logger
+from .memory import HistoryMemoryAccountant
 from .options import ALL_OPTIONS
-from .process import Process
+from .pool import ShellPool
+from .process import Process, get_cwd_for_pid
 from .rc import STARTUP_COMMANDS
+from .scheduler import OutputScheduler, FrameScheduler
+from .metadata import MetadataRefresher
+from .reaper import ChildReaper
+from .spawner import Spawner
 from .server import ServerConnection, bind_socket
 from .style import PymuxStyle
 from .utils import get_default_shell
@@ -98,6 +104,11 @@ class Pymux(object):
         self.status_keys_vi_mode = False
         self.mode_keys_vi_mode = False
         self.history_limit = 2000
+        self.history_compress_after = 1000
+        self.history_file_backed = False
+        self.history_memory_limit = 0  # In bytes. Zero means no limit.
+        self.render_fps = 60  # Zero means no limit.
+        self.shell_pool_size = 0
         self.default_terminal = 'xterm-256color'
         self.status_left = '[#S] '
         self.status_left_length = 20
@@ -111,6 +122,12 @@ class Pymux(object):
 
         self.options = ALL_OPTIONS
 
+        # Enforces the `history_memory_limit`.
+        self.history_accountant = HistoryMemoryAccountant(self)
+
+        # Shells that are started in advance. (`shell_pool_size`.)
+        self.shell_pool = ShellPool(self)
+
         # When no panes are available.
         self.original_cwd = os.getcwd()
 
@@ -135,6 +152,23 @@ class Pymux(object):
         # Create eventloop.
         self.eventloop = PosixEventLoop()
 
+        # Parses the output of the panes.
+        self.output_scheduler = OutputScheduler(self.eventloop)
+
+        # Helper process that starts the processes for the panes.
+        self.spawner = Spawner()
+
+        # Collects the exit status of the processes that we forked ourself.
+        self.reaper = ChildReaper(self.eventloop)
+
+        # Caches the names and working directories of the processes.
+        self.metadata_refresher = MetadataRefresher(
+            self.eventloop, lambda: self.invalidate())
+
+        # Limits the amount of redraws per second.
+        self.frame_scheduler = FrameScheduler(
+            self.eventloop, self._invalidate_clis, lambda: self.render_fps)
+
         # Key bindings manager.
         self.key_bindings_manager = KeyBindingsManager(self)
 
@@ -207,8 +241,50 @@ class Pymux(object):
         assert command is None or isinstance(command, six.text_type)
         assert start_directory is None or isinstance(start_directory, six.text_type)
 
+        # Start directory.
+        if start_directory:
+            path = start_directory
+        elif window and window.active_process:
+            # When the path of the active process is known,
+            # start the new process at the same location. (Don't take the
+            # cached value, that is only refreshed every few seconds.)
+            path = get_cwd_for_pid(window.active_process.pid)
+        else:
+            path = None
+
+        path = path or self.original_cwd
+
+        if command:
+            command = command.split()
+        else:
+            # Take a shell that was started in advance.
+            pane = self.shell_pool.take(path)
+            if pane:
+                logger.info('Took pane %r from the shell pool.', pane.pane_id)
+                pane.has_activity = False
+                return pane
+
+            command = [self.default_shell]
+
+        return self.start_pane(command, path)
+
+    def start_pane(self, command, path):
+        """
+        Create a new :class:`pymux.arrangement.Pane` instance and start the
+        process.
+
+        :param command: The command to run. (List of strings.)
+        :param path: The working directory.
+        """
+        assert isinstance(command, list)
+
         def done_callback():
             " When the process finishes. "
+            # Idle pane from the shell pool.
+            if pane in self.shell_pool:
+                self.shell_pool.remove(pane)
+                return
+
             if not self.remain_on_exit:
                 # Remove pane from layout.
                 self.arrangement.remove_pane(pane)
@@ -225,45 +301,29 @@ class Pymux(object):
                 for c in self.clis.values():
                     c.output.bell()
 
-        # Start directory.
-        if start_directory:
-            path = start_directory
-        elif window and window.active_process:
-            # When the path of the active process is known,
-            # start the new process at the same location.
-            path = window.active_process.get_cwd()
-        else:
-            path = None
-
-        def before_exec():
-            " Called in the process fork (in the child process). "
-            # Go to this directory.
-            try:
-                os.chdir(path or self.original_cwd)
-            except OSError:
-                pass  # No such file or directory.
-
-            # Set terminal variable. (We emulate xterm.)
-            os.environ['TERM'] = self.default_terminal
-
-            # Make sure to set the PYMUX environment variable.
-            if self.socket_name:
-                os.environ['PYMUX'] = '%s,%i' % (
-                    self.socket_name, pane.pane_id)
-
-        if command:
-            command = command.split()
-        else:
-            command = [self.default_shell]
+        # Set terminal variable. (We emulate xterm.)
+        env = {'TERM': self.default_terminal}
 
         # Create process and pane.
         process = Process.from_command(
-            self.eventloop, self.invalidate, command, done_callback,
+            self.eventloop, lambda: self.invalidate_pane(pane), command, done_callback,
             bell_func=bell,
-            before_exec_func=before_exec)
+            get_history_limit=lambda: self.history_limit,
+            get_history_compress_after=lambda: self.history_compress_after,
+            get_history_file_backed=lambda: self.history_file_backed,
+            scheduler=self.output_scheduler,
+            cwd=path,
+            env=env,
+            spawner=self.spawner,
+            reaper=self.reaper,
+            metadata_refresher=self.metadata_refresher)
 
         pane = Pane(process)
 
+        # Make sure to set the PYMUX environment variable.
+        if self.socket_name:
+            process.env['PYMUX'] = '%s,%i' % (self.socket_name, pane.pane_id)
+
         # Keep track of panes. This is a WeakKeyDictionary, we only add, but
         # don't remove.
         self.panes_by_id[pane.pane_id] = pane
@@ -274,9 +334,45 @@ class Pymux(object):
         return pane
 
     def invalidate(self):
-        " Invalidate the UI for all clients. "
+        " Invalidate the UI for all clients. (In the next frame.) "
+        self.frame_scheduler.invalidate()
+
+        # The output of the processes can have grown the history.
+        self.history_accountant.check()
+
+    def invalidate_pane(self, pane):
+        """
+        Invalidate the UI of the clients that display this pane. When it is
+        not visible for any client, mark the pane as having activity.
+        """
+        assert isinstance(pane, Pane)
+
+        clis = [c for c in self.clis.values()
+                if self.arrangement.pane_is_visible(c, pane)]
+
+        if clis:
+            self.frame_scheduler.invalidate(clis)
+
+        elif not pane.has_activity:
+            # Redraw the status bars.
+            pane.has_activity = True
+            self.frame_scheduler.invalidate()
+
+        self.history_accountant.check()
+
+    def _client_invalidated(self):
+        """
+        Called when a client was invalidated. Redraw the other clients as well.
+        (Unless this is the frame scheduler, invalidating the clients.)
+        """
+        if not self.frame_scheduler.rendering:
+            self.invalidate()
+
+    def _invalidate_clis(self, clis=None):
+        " Invalidate the given clients. (All clients when `None`.) "
         for c in self.clis.values():
-            c.invalidate()
+            if clis is None or c in clis:
+                c.invalidate()
 
     def create_window(self, cli=None, command=None, start_directory=None, name=None):
         """
@@ -398,7 +494,7 @@ class Pymux(object):
         # change size, so everything has to be redrawn.)
         self.invalidate()
 
-        cli.on_invalidate += lambda: self.invalidate()
+        cli.on_invalidate += lambda: self._client_invalidated()
 
         # Handle start-up comands.
         # (Does initial key bindings.)
@@ -469,7 +565,20 @@ class Pymux(object):
         connection = ServerConnection(self, connection, client_address)
         self.connections.append(connection)
 
+    def start_spawner(self):
+        """
+        Fork the helper process that starts the processes for the panes.
+        This has to happen before any panes are created, while the server
+        process is still small.
+        """
+        self.spawner.start()
+        self.spawner.connect(self.eventloop)
+
     def run_server(self):
+        self.start_spawner()
+        self.reaper.start()
+        self.metadata_refresher.start()
+
         # Ignore keyboard. (When people run "pymux server" and press Ctrl-C.)
         # Pymux has to be terminated by termining all the processes running in
         # its panes.
@@ -504,6 +613,10 @@ class Pymux(object):
         This is mainly useful for debugging.
         """
         self._runs_standalone = True
+        self.start_spawner()
+        self.reaper.start()
+        self.metadata_refresher.start()
+
         cli = self.create_cli(
             connection=None,
             output=Vt100_Output.from_pty(sys.stdout, true_color=true_color))
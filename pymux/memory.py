@@ -0,0 +1,68 @@
+"""
+Accounting of the memory that is used by the history of the panes.
+"""
+from __future__ import unicode_literals
+
+import time
+
+__all__ = (
+    'HistoryMemoryAccountant',
+)
+
+
+class HistoryMemoryAccountant(object):
+    """
+    Keep the memory that is used by the history of all panes together below
+    the `history-memory-limit` option.
+
+    When the panes use more than that, the oldest history is removed from the
+    panes that were viewed least recently, until we are below the limit again.
+
+    :param pymux: The :class:`pymux.main.Pymux` instance.
+    :param interval: Minimum amount of seconds between two checks.
+    """
+    def __init__(self, pymux, interval=1.):
+        self.pymux = pymux
+        self.interval = interval
+        self._last_check = 0
+
+    def check(self):
+        """
+        Enforce the memory limit, unless we did that less than `interval`
+        seconds ago. (This is cheap and can be called after every output.)
+        """
+        now = time.time()
+
+        if now - self._last_check >= self.interval:
+            self._last_check = now
+            self.enforce()
+
+    def enforce(self):
+        " Enforce the memory limit now. "
+        limit = self.pymux.history_memory_limit
+        if not limit:
+            return
+
+        # (The scrollback buffers keep count of their memory usage, so this
+        # doesn't walk over the history.)
+        panes = [p for w in self.pymux.arrangement.windows for p in w.panes]
+        usage = dict((p, p.process.screen.memory_usage()) for p in panes)
+        total = sum(usage.values())
+
+        for pane in sorted(panes, key=lambda p: p.last_viewed):
+            screen = pane.process.screen
+
+            while total > limit and screen.history_size > 0:
+                # Estimate how many lines we have to remove, using the average
+                # size of a line in this pane.
+                line_size = float(usage[pane]) / (screen.history_size + screen.lines)
+                count = int((total - limit) / line_size) + 1
+
+                screen.trim_history(count)
+
+                new_usage = screen.memory_usage()
+                total -= usage[pane] - new_usage
+                usage[pane] = new_usage
+
+            if total <= limit:
+                break
@@ -0,0 +1,94 @@
+"""
+Background refresh of the process metadata (name and working directory).
+
+Reading the name of the process in a pane takes a few system calls. The
+status bar needs it for every window, each time it is rendered, so we cache
+it and refresh the cache in a thread.
+"""
+from __future__ import unicode_literals
+
+import threading
+import time
+
+__all__ = (
+    'MetadataRefresher',
+)
+
+
+class MetadataRefresher(object):
+    """
+    Refresh the metadata of all processes every `interval` seconds, and of
+    one process when requested, in a worker thread.
+
+    :param eventloop: The prompt_toolkit event loop.
+    :param invalidate: Called (in the event loop) when any metadata changed.
+    :param interval: Seconds between refreshing all processes.
+    :param min_interval: Minimum amount of seconds between two refreshes.
+        (When many refreshes are requested, like for a pane that floods its
+        output.)
+    """
+    def __init__(self, eventloop, invalidate, interval=2., min_interval=.2):
+        assert callable(invalidate)
+
+        self.eventloop = eventloop
+        self.invalidate = invalidate
+        self.interval = interval
+        self.min_interval = min_interval
+
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._processes = []
+        self._requested = set()
+        self._last_full_refresh = 0
+        self._thread = None
+
+    def start(self):
+        " Start the worker thread. "
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def add(self, process):
+        " Keep the metadata of this process up to date. "
+        with self._lock:
+            self._processes.append(process)
+
+        self.request(process)
+
+    def request(self, process):
+        " Refresh the metadata of this process soon. "
+        if process not in self._requested:
+            with self._lock:
+                self._requested.add(process)
+            self._event.set()
+
+    def _run(self):
+        while True:
+            # (Requests don't postpone the refresh of all processes. Otherwise
+            # the panes without output would never be refreshed while any
+            # other pane is producing output.)
+            self._event.wait(max(0, self._last_full_refresh + self.interval - time.time()))
+
+            with self._lock:
+                self._event.clear()
+                self._processes = [p for p in self._processes if not p.is_terminated]
+
+                now = time.time()
+                if now - self._last_full_refresh >= self.interval:
+                    self._last_full_refresh = now
+                    processes = list(self._processes)
+                else:
+                    processes = list(self._requested)
+
+                self._requested.clear()
+
+            changed = False
+            for p in processes:
+                if not p.is_terminated and p.update_metadata():
+                    changed = True
+
+            if changed:
+                self.eventloop.call_from_executor(self.invalidate)
+
+            time.sleep(self.min_interval)
@@ -167,9 +167,16 @@ ALL_OPTIONS = {
     'bell': OnOffOption('enable_bell'),
     'history-limit': PositiveIntOption(
         'history_limit', [200, 500, 1000, 2000, 5000, 10000]),
+    'history-compress-after': PositiveIntOption(
+        'history_compress_after', [0, 200, 500, 1000, 2000, 5000]),
+    'history-file-backed': OnOffOption('history_file_backed'),
+    'history-memory-limit': PositiveIntOption(
+        'history_memory_limit', [0, 50000000, 100000000, 500000000]),
     'mouse': OnOffOption('enable_mouse_support'),
     'prefix': KeyPrefixOption(),
     'remain-on-exit': OnOffOption('remain_on_exit'),
+    'render-fps': PositiveIntOption('render_fps', [0, 10, 30, 60, 120]),
+    'shell-pool-size': PositiveIntOption('shell_pool_size', [0, 1, 2, 4]),
     'status': OnOffOption('enable_status'),
     'status-keys': KeysOption('status_keys_vi_mode'),
     'mode-keys': KeysOption('mode_keys_vi_mode'),
@@ -0,0 +1,130 @@
+"""
+Pool of shells that are started in advance, so that new windows and panes
+don't have to wait for the shell to initialize.
+"""
+from __future__ import unicode_literals
+
+import datetime
+import signal
+import threading
+import time
+
+__all__ = (
+    'ShellPool',
+)
+
+
+class ShellPool(object):
+    """
+    Keep `shell-pool-size` idle panes running the default shell, for every
+    directory in which a shell was started recently.
+
+    Taking a pane from the pool starts a new one in the background. Panes
+    that were not used for `timeout` seconds are terminated.
+
+    :param pymux: The :class:`pymux.main.Pymux` instance.
+    :param timeout: Amount of seconds after which idle panes are terminated.
+    """
+    def __init__(self, pymux, timeout=600):
+        self.pymux = pymux
+        self.timeout = timeout
+
+        self._panes = {}  # Maps the directory to a list of (pane, time) tuples.
+        self._retire_scheduled = False
+
+    def __contains__(self, pane):
+        return any(pane is p for entries in self._panes.values() for p, _ in entries)
+
+    def remove(self, pane):
+        " Remove this pane from the pool. (When its process terminated.) "
+        for entries in self._panes.values():
+            entries[:] = [(p, t) for p, t in entries if p is not pane]
+
+    def take(self, directory):
+        """
+        Return an idle :class:`pymux.arrangement.Pane` that runs the default
+        shell in this directory, or `None` when there is none. (Either way, the
+        pool is replenished in the background.)
+        """
+        size = self.pymux.shell_pool_size
+        if not size:
+            return
+
+        entries = self._panes.get(directory, [])
+        result = None
+
+        while entries and result is None:
+            pane, _ = entries.pop(0)
+
+            if self._is_usable(pane):
+                result = pane
+            else:
+                self._terminate(pane)
+
+        self._replenish_later(directory)
+        return result
+
+    def _is_usable(self, pane):
+        " True when the pane still matches the current options. "
+        process = pane.process
+
+        return (not process.is_terminated and
+                process.command == [self.pymux.default_shell] and
+                process.env.get('TERM') == self.pymux.default_terminal)
+
+    def _replenish_later(self, directory):
+        """
+        Start the missing panes for this directory, when the event loop has
+        nothing else to do. (Starting the pane that the user asked for has
+        priority.)
+        """
+        max_postpone_until = datetime.datetime.now() + datetime.timedelta(seconds=1)
+        self.pymux.eventloop.call_from_executor(
+            lambda: self._replenish(directory),
+            _max_postpone_until=max_postpone_until)
+
+    def _replenish(self, directory):
+        entries = self._panes.setdefault(directory, [])
+
+        while len(entries) < self.pymux.shell_pool_size:
+            pane = self.pymux.start_pane([self.pymux.default_shell], directory)
+            entries.append((pane, time.time()))
+
+        self._schedule_retire()
+
+    def _schedule_retire(self):
+        " Check for idle panes after `timeout` seconds. "
+        if self._retire_scheduled:
+            return
+
+        self._retire_scheduled = True
+
+        def retire():
+            self._retire_scheduled = False
+            self._retire_idle()
+
+        # (A daemon thread, this should not keep the server alive.)
+        timer = threading.Timer(
+            self.timeout, lambda: self.pymux.eventloop.call_from_executor(retire))
+        timer.daemon = True
+        timer.start()
+
+    def _retire_idle(self):
+        " Terminate the panes that were idle for too long. "
+        now = time.time()
+        size = self.pymux.shell_pool_size
+
+        for directory, entries in list(self._panes.items()):
+            for i, (pane, start_time) in enumerate(list(entries)):
+                if i >= size or now - start_time >= self.timeout:
+                    self._terminate(pane)
+
+            if not entries:
+                del self._panes[directory]
+
+        if self._panes:
+            self._schedule_retire()
+
+    def _terminate(self, pane):
+        self.remove(pane)
+        pane.process.send_signal(signal.SIGHUP)
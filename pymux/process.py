@@ -4,14 +4,19 @@ The child process.
 from __future__ import unicode_literals
 
 from prompt_toolkit.eventloop.base import EventLoop
-from prompt_toolkit.eventloop.posix_utils import PosixStdinReader
 from prompt_toolkit.document import Document
 from pygments.token import Token
 
 from .key_mappings import prompt_toolkit_key_to_vt100_key
+from .reader import PtyReader
+from .reaper import exit_status_to_code
+from .log import logger
 from .screen import BetterScreen
+from .spawner import SpawnError
 from .stream import BetterStream
-from .utils import set_terminal_size, pty_make_controlling_tty
+from .utils import set_terminal_size, pty_make_controlling_tty, set_cloexec, get_open_file_descriptors
+
+from collections import deque
 
 import os
 import resource
@@ -45,13 +50,46 @@ class Process(object):
         this calls execv.)
     :param bell_func: Called when the process does a `bell`.
     :param done_callback: Called when the process terminates.
+    :param get_history_limit: Callable that returns the amount of lines to
+        keep in the scrollback buffer.
+    :param get_history_compress_after: Callable that returns the amount of
+        lines above the visible area that are kept uncompressed.
+    :param get_history_file_backed: Callable that returns True when the
+        compressed history has to be stored in a file.
+    :param scheduler: :class:`pymux.scheduler.OutputScheduler` instance that
+        decides when the output is parsed. When not given, the output is
+        parsed immediately after reading.
+    :param command: The command (list of strings) that `exec_func` executes.
+        When this and a running :class:`pymux.spawner.Spawner` are given, the
+        process is started by the spawner instead of forking.
+    :param cwd: Working directory for the process.
+    :param env: Dictionary with environment variables to set for the process.
+    :param spawner: :class:`pymux.spawner.Spawner` instance.
+    :param reaper: :class:`pymux.reaper.ChildReaper` instance. When given, the
+        reaper reports the termination of the process, otherwise we wait for
+        it in a thread.
+    :param metadata_refresher: :class:`pymux.metadata.MetadataRefresher`
+        instance. When given, the name and working directory of the process
+        are cached and refreshed in the background.
     """
-    def __init__(self, eventloop, invalidate, exec_func, bell_func=None, done_callback=None):
+    #: Stop reading from the pty when this amount of characters is waiting to
+    #: be parsed. (The process will block when writing more output.)
+    max_pending_output = 512 * 1024
+
+    def __init__(self, eventloop, invalidate, exec_func, bell_func=None,
+                 done_callback=None, get_history_limit=None,
+                 get_history_compress_after=None, get_history_file_backed=None,
+                 scheduler=None, command=None, cwd=None, env=None, spawner=None,
+                 reaper=None, metadata_refresher=None):
         assert isinstance(eventloop, EventLoop)
         assert callable(invalidate)
         assert callable(exec_func)
         assert bell_func is None or callable(bell_func)
         assert done_callback is None or callable(done_callback)
+        assert get_history_limit is None or callable(get_history_limit)
+        assert get_history_compress_after is None or callable(get_history_compress_after)
+        assert get_history_file_backed is None or callable(get_history_file_backed)
+        assert command is None or isinstance(command, list)
 
         self.eventloop = eventloop
         self.invalidate = invalidate
@@ -59,14 +97,33 @@ class Process(object):
         self.done_callback = done_callback
         self.pid = None
         self.is_terminated = False
-        self.suspended = False
+        self.exit_status = None  # Exit code, negative when killed by a signal.
         self.slow_motion = False  # For debugging
+        self._exec_done = False
+        self._spawned = False  # Started by the spawn helper.
+        self.scheduler = scheduler
+        self.command = command
+        self.cwd = cwd
+        self.env = dict(env or {})
+        self.spawner = spawner
+        self.reaper = reaper
+        self.metadata_refresher = metadata_refresher
+
+        # Cached metadata. (When there is a `metadata_refresher`.)
+        self._name = None
+        self._current_cwd = None
+        self._metadata_requested = 0  # Time of the last refresh request.
+
+        # Output that was read, but not yet parsed.
+        self._pending_output = deque()
+        self._pending_output_size = 0
+        self._throttled = False
 
         # Create pseudo terminal for this pane.
         self.master, self.slave = os.openpty()
 
         # Master side -> attached to terminal emulator.
-        self._reader = PosixStdinReader(self.master)
+        self._reader = PtyReader(self.master)
 
         # Create output stream and attach to screen
         self.sx = 120
@@ -74,7 +131,10 @@ class Process(object):
 
         self.screen = BetterScreen(self.sx, self.sy,
                                    write_process_input=self.write_input,
-                                   bell_func=bell_func)
+                                   bell_func=bell_func,
+                                   get_history_limit=get_history_limit,
+                                   get_history_compress_after=get_history_compress_after,
+                                   get_history_file_backed=get_history_file_backed)
 
         self.stream = BetterStream(self.screen)
         self.stream.attach(self.screen)
@@ -88,14 +148,21 @@ class Process(object):
         self._connect_reader()
         self._waitpid()
 
+        if self.metadata_refresher:
+            self.metadata_refresher.add(self)
+
     @classmethod
     def from_command(cls, eventloop, invalidate, command, done_callback,
-                     bell_func=None, before_exec_func=None):
+                     bell_func=None, before_exec_func=None, get_history_limit=None,
+                     get_history_compress_after=None, get_history_file_backed=None,
+                     scheduler=None, cwd=None, env=None, spawner=None,
+                     reaper=None, metadata_refresher=None):
         """
         Create Process from command,
         e.g. command=['python', '-c', 'print("test")']
 
         :param before_exec_func: Function that is called before `exec` in the process fork.
+            (Not when the process is started by the `spawner`.)
         """
         assert isinstance(command, list)
 
@@ -109,40 +176,86 @@ class Process(object):
                     os.execv(path, command)
 
         return cls(eventloop, invalidate, execv,
-                   bell_func=bell_func, done_callback=done_callback)
+                   bell_func=bell_func, done_callback=done_callback,
+                   get_history_limit=get_history_limit,
+                   get_history_compress_after=get_history_compress_after,
+                   get_history_file_backed=get_history_file_backed,
+                   scheduler=scheduler, command=command, cwd=cwd, env=env,
+                   spawner=spawner, reaper=reaper,
+                   metadata_refresher=metadata_refresher)
 
     def _start(self):
         """
         Create fork and start the child process.
         """
+        if self.command and self.spawner and self.spawner.running:
+            try:
+                self._spawn()
+                return
+            except SpawnError as e:
+                logger.warning('Could not use spawn helper: %s', e)
+
+        # Pipe that is closed in the child when `exec` is called.
+        exec_r, exec_w = os.pipe()
+        set_cloexec(exec_w)
+
         pid = os.fork()
 
         if pid == 0:
-            self._in_child()
+            os.close(exec_r)
+            self._in_child(exec_w)
         elif pid > 0:
             # In parent.
+            os.close(exec_w)
             os.close(self.slave)
             self.slave = None
+            self.pid = pid
 
-            # We wait a very short while, to be sure the child had the time to
-            # call _exec. (Otherwise, we are still sharing signal handlers and
-            # FDs.) Resizing the pty, when the child is still in our Python
-            # code and has the signal handler from prompt_toolkit, but closed
-            # the 'fd' for 'call_from_executor', will cause OSError.
-            time.sleep(0.1)
+            # Until the child called `exec`, we are still sharing signal
+            # handlers and FDs. Resizing the pty, when the child is still in
+            # our Python code and has the signal handler from prompt_toolkit,
+            # but closed the 'fd' for 'call_from_executor', will cause OSError.
+            # So, wait (without blocking the event loop) until the pipe is
+            # closed, before resizing.
+            def exec_done():
+                self.eventloop.remove_reader(exec_r)
+                os.close(exec_r)
+                self._exec_done = True
 
-            self.pid = pid
+                if self.master is not None:
+                    set_terminal_size(self.master, self.sy, self.sx)
+
+            self.eventloop.add_reader(exec_r, exec_done)
+
+    def _spawn(self):
+        """
+        Start the child process through the spawn helper.
+        """
+        env = dict(os.environ)
+        env.update(self.env)
+
+        self.pid = self.spawner.spawn(
+            self.slave, self.command, self.cwd or os.getcwd(), env)
+
+        os.close(self.slave)
+        self.slave = None
+
+        # The helper doesn't have the signal handlers of the server.
+        self._exec_done = True
+        self._spawned = True
 
     def _waitpid(self):
         """
-        Create an executor that waits and handles process termination.
+        Handle process termination. (When the process was started by the
+        spawn helper, the helper will tell us. Otherwise, the reaper does, or
+        we wait in an executor.)
         """
         def wait_for_finished():
             " Wait for PID in executor. "
-            os.waitpid(self.pid, 0)
-            self.eventloop.call_from_executor(done)
+            _, status = os.waitpid(self.pid, 0)
+            self.eventloop.call_from_executor(lambda: done(status))
 
-        def done():
+        def done(status):
             " PID received. Back in the main thread. "
             # Close pty and remove reader.
             os.close(self.master)
@@ -151,9 +264,15 @@ class Process(object):
 
             # Callback.
             self.is_terminated = True
+            self.exit_status = exit_status_to_code(status)
             self.done_callback()
 
-        self.eventloop.run_in_executor(wait_for_finished)
+        if self._spawned:
+            self.spawner.watch(self.pid, done)
+        elif self.reaper and self.reaper.running:
+            self.reaper.watch(self.pid, done)
+        else:
+            self.eventloop.run_in_executor(wait_for_finished)
 
     def set_size(self, width, height):
         """
@@ -162,7 +281,9 @@ class Process(object):
         assert isinstance(width, int)
         assert isinstance(height, int)
 
-        if self.master is not None:
+        # (When the child was forked, but didn't call `exec` yet, this is
+        # postponed.)
+        if self.master is not None and (self.pid is None or self._exec_done):
             set_terminal_size(self.master, height, width)
         self.screen.resize(lines=height, columns=width)
 
@@ -172,8 +293,13 @@ class Process(object):
         self.sx = width
         self.sy = height
 
-    def _in_child(self):
-        " Will be executed in the forked child. "
+    def _in_child(self, exec_w):
+        """
+        Will be executed in the forked child.
+
+        :param exec_w: Write end of the pipe that tells the parent that `exec`
+            was called. (It has the close-on-exec flag.)
+        """
         os.close(self.master)
 
         # Remove signal handler for SIGWINCH as early as possible.
@@ -188,9 +314,18 @@ class Process(object):
         os.dup2(self.slave, 1)
         os.dup2(self.slave, 2)
 
+        # Working directory and environment.
+        if self.cwd:
+            try:
+                os.chdir(self.cwd)
+            except OSError:
+                pass  # No such file or directory.
+
+        os.environ.update(self.env)
+
         # Execute in child.
         try:
-            self._close_file_descriptors()
+            self._close_file_descriptors(keep=[exec_w])
             self.exec_func()
         except Exception:
             traceback.print_exc()
@@ -199,21 +334,36 @@ class Process(object):
             os._exit(1)
         os._exit(0)
 
-    def _close_file_descriptors(self):
+    def _close_file_descriptors(self, keep=()):
         # Do not allow child to inherit open file descriptors from parent.
         # (In case that we keep running Python code. We shouldn't close them.
         # because the garbage collector is still active, and he will close them
         # eventually.)
-        max_fd = resource.getrlimit(resource.RLIMIT_NOFILE)[-1]
+        open_fds = get_open_file_descriptors()
+
+        if open_fds is not None:
+            # Only close the FDs that are actually open. (The maximum number
+            # of FDs can be very large, walking through all of them is slow.)
+            for fd in open_fds:
+                if fd > 2 and fd not in keep:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass  # E.g. the FD that was used for the listing.
+        else:
+            max_fd = resource.getrlimit(resource.RLIMIT_NOFILE)[-1]
 
-        try:
-            os.closerange(3, max_fd)
-        except OverflowError:
             # On OS X, max_fd can return very big values, than closerange
             # doesn't understand, e.g. 9223372036854775807. In this case, just
             # use 4096. This is what Linux systems report, and should be
             # sufficient. (I hope...)
-            os.closerange(3, 4096)
+            if max_fd > 2 ** 31 - 1:
+                max_fd = 4096
+
+            start = 3
+            for fd in sorted(keep) + [max_fd]:
+                os.closerange(start, fd)
+                start = fd + 1
 
     def write_input(self, data, paste=False):
         """
@@ -263,9 +413,22 @@ class Process(object):
             d = self._reader.read()
 
         if d:
-            self.stream.feed(d)
-            self.invalidate()
-        else:
+            # The running command could have changed.
+            self.request_metadata_update()
+
+            if self.scheduler is None:
+                self.stream.feed(d)
+                self.invalidate()
+            else:
+                self._pending_output.append(d)
+                self._pending_output_size += len(d)
+                self.scheduler.schedule(self)
+
+                # Don't read more output than we can parse.
+                if self._pending_output_size >= self.max_pending_output:
+                    self._throttled = True
+                    self.eventloop.remove_reader(self.master)
+        elif self._reader.closed:
             # End of stream. Remove child.
             self.eventloop.remove_reader(self.master)
 
@@ -278,36 +441,85 @@ class Process(object):
                 self.eventloop.call_from_executor(self._connect_reader)
             self.eventloop.run_in_executor(connect_with_delay)
 
-    def suspend(self):
+    def process_output(self, max_size):
         """
-        Suspend process. Stop reading stdout. (Called when going into copy mode.)
+        Parse at most `max_size` characters of the output that was read.
+        (Called by the scheduler.) Return True when more output is pending.
         """
-        self.suspended = True
-        self.eventloop.remove_reader(self.master)
+        pending = self._pending_output
+        size = 0
 
-    def resume(self):
-        """
-        Resume from 'suspend'.
-        """
-        if self.suspended and self.master is not None:
+        while pending and size < max_size:
+            data = pending.popleft()
+
+            if size + len(data) > max_size:
+                pending.appendleft(data[max_size - size:])
+                data = data[:max_size - size]
+
+            size += len(data)
+            self.stream.feed(data)
+
+        self._pending_output_size -= size
+
+        if size:
+            self.invalidate()
+
+        # Continue reading when we were throttled.
+        if (self._throttled and
+                self._pending_output_size < self.max_pending_output):
+            self._throttled = False
             self._connect_reader()
-            self.suspended = False
+
+        return bool(pending)
 
     def get_cwd(self):
         """
         The current working directory for this process. (Or `None` when
-        unknown.)
+        unknown.) This can be a few seconds old, it's meant for display.
         """
-        return get_cwd_for_pid(self.pid)
+        if self.metadata_refresher:
+            return self._current_cwd
+        else:
+            return get_cwd_for_pid(self.pid)
 
     def get_name(self):
         """
         The name for this process. (Or `None` when unknown.)
         """
-        # TODO: Maybe cache for short time.
-        if self.master is not None:
+        if self.metadata_refresher:
+            return self._name
+        elif self.master is not None:
             return get_name_for_fd(self.master)
 
+    def update_metadata(self):
+        """
+        Refresh the cached name and working directory. Return `True` when
+        they changed. (Called from the thread of the `metadata_refresher`.)
+        """
+        master = self.master
+        name = get_name_for_fd(master) if master is not None else None
+        cwd = get_cwd_for_pid(self.pid) if self.pid else None
+
+        changed = (name, cwd) != (self._name, self._current_cwd)
+        self._name = name
+        self._current_cwd = cwd
+        return changed
+
+    def request_metadata_update(self):
+        """
+        Refresh the cached name and working directory soon. (This is called
+        for every read, so we send at most one request every `min_interval`
+        seconds of the refresher.)
+        """
+        refresher = self.metadata_refresher
+
+        if refresher and not self.is_terminated:
+            now = time.time()
+
+            if now - self._metadata_requested >= refresher.min_interval:
+                self._metadata_requested = now
+                refresher.request(self)
+
     def send_signal(self, signal):
         " Send signal to running process. "
         assert isinstance(signal, int), type(signal)
@@ -324,8 +536,8 @@ class Process(object):
         text = []
         token_list = []
 
-        first_row = min(data_buffer.keys())
-        last_row = max(data_buffer.keys())
+        first_row = data_buffer.first_line
+        last_row = data_buffer.end - 1
 
         def token_has_no_background(token):
             try:
@@ -336,10 +548,9 @@ class Process(object):
 
         for row_index in range(first_row, last_row + 1):
             row = data_buffer[row_index]
-            max_column = max(row.keys()) if row else 0
 
             # Remove trailing whitespace. (If the background is transparent.)
-            row_data = [row[x] for x in range(0, max_column + 1)]
+            row_data = [row[x] for x in range(len(row))]
 
             while (row_data and row_data[-1].char.isspace() and
                    token_has_no_background(row_data[-1].token)):
@@ -391,10 +602,10 @@ def get_name_for_fd(fd):
     Return the process name for a given process ID.
     """
     if sys.platform in ('linux', 'linux2'):
-        pgrp = os.tcgetpgrp(fd)
-
         try:
+            pgrp = os.tcgetpgrp(fd)
+
             with open('/proc/%s/cmdline' % pgrp, 'rb') as f:
                 return f.read().decode('utf-8', 'ignore').split('\0')[0]
-        except IOError:
-            pass
+        except (IOError, OSError):
+            pass  # (Also when the pane was closed in the meantime.)
@@ -0,0 +1,110 @@
+"""
+Reading the output of the processes from the pseudo terminals.
+"""
+from __future__ import unicode_literals
+from codecs import getincrementaldecoder
+
+import errno
+import os
+import select
+import six
+
+__all__ = (
+    'PtyReader',
+)
+
+
+class PtyReader(object):
+    """
+    Non blocking reader for the master side of a pseudo terminal.
+
+    The data is read into a buffer that is reused for every call, and decoded
+    with an incremental UTF-8 decoder. (A read can stop in the middle of a
+    UTF-8 byte sequence.) Invalid bytes are replaced by U+FFFD.
+
+    The amount of bytes that we read at once grows when the process is
+    producing a lot of output, so that we need fewer iterations of the event
+    loop, and shrinks again when the output slows down.
+
+    :param fd: File descriptor of the master side of the pseudo terminal.
+    :param min_size: Amount of bytes to read when there is little output.
+    :param max_size: Maximum amount of bytes to read at once.
+    """
+    def __init__(self, fd, min_size=4096, max_size=256 * 1024):
+        assert isinstance(fd, int)
+        assert 0 < min_size <= max_size
+
+        self.fd = fd
+        self.min_size = min_size
+        self.max_size = max_size
+
+        #: True when the end of the stream has been reached.
+        self.closed = False
+
+        self._size = min_size
+        self._buffer = bytearray(min_size)
+
+        self._decoder = getincrementaldecoder('utf-8')(errors='replace')
+
+    def read(self, count=None):
+        """
+        Read the available output and return it as a string. (This can be
+        empty, even when `closed` is False.)
+
+        :param count: Maximum amount of bytes to read. (When not given, the
+            adaptive read size is used.)
+        """
+        size = count or self._size
+
+        if len(self._buffer) < size:
+            self._buffer = bytearray(size)
+
+        # A pseudo terminal returns at most a few KiB for every `read` call, so
+        # keep reading as long as there is more output available.
+        view = memoryview(self._buffer)
+        length = 0
+
+        while length < size:
+            try:
+                n = self._read_into(view[length:size])
+            except OSError as e:
+                # EINTR happens when a SIGWINCH was received, EAGAIN when
+                # there is nothing to read. Anything else (EIO on Linux) means
+                # that the process closed the pseudo terminal.
+                if e.errno not in (errno.EINTR, errno.EAGAIN):
+                    self.closed = True
+                break
+
+            if n == 0:
+                self.closed = True
+                break
+
+            length += n
+
+            if not select.select([self.fd], [], [], 0)[0]:
+                break
+
+        # Grow the read size when the buffer was filled completely, shrink it
+        # when it was mostly empty.
+        if count is None:
+            if length == size:
+                self._size = min(size * 2, self.max_size)
+            elif length < size // 4:
+                self._size = max(size // 2, self.min_size)
+
+        data = view[:length]
+        if six.PY2:
+            data = data.tobytes()
+
+        return self._decoder.decode(data)
+
+    if hasattr(os, 'readv'):
+        def _read_into(self, view):
+            " Read into the given memoryview. Return the amount of bytes. "
+            return os.readv(self.fd, [view])
+    else:
+        def _read_into(self, view):
+            # Python 2 has no `os.readv`.
+            data = os.read(self.fd, len(view))
+            view[:len(data)] = data
+            return len(data)
@@ -0,0 +1,132 @@
+"""
+Handle the termination of child processes.
+
+Instead of having one thread per pane that blocks in `os.waitpid`, we handle
+SIGCHLD. The signal handler writes to a pipe that is attached to the event
+loop, and in the event loop we collect the exit status of all terminated
+children at once.
+"""
+from __future__ import unicode_literals
+
+from .log import logger
+from .utils import set_cloexec
+
+import errno
+import fcntl
+import os
+import signal
+
+__all__ = (
+    'ChildReaper',
+    'exit_status_to_code',
+)
+
+
+class ChildReaper(object):
+    """
+    Collect the exit status of the child processes.
+
+    Usage::
+
+        reaper = ChildReaper(eventloop)
+        reaper.start()  # In the main thread.
+        reaper.watch(pid, callback)
+
+    :param eventloop: The prompt_toolkit event loop.
+    """
+    def __init__(self, eventloop):
+        self.eventloop = eventloop
+
+        self._read_fd = None
+        self._write_fd = None
+        self._callbacks = {}  # Maps the PID to the callback of `watch`.
+
+    @property
+    def running(self):
+        " True when the SIGCHLD handler is installed. "
+        return self._read_fd is not None
+
+    def start(self):
+        """
+        Install the SIGCHLD handler. (This has to be called from the main
+        thread.)
+        """
+        if self.running:
+            return
+
+        self._read_fd, self._write_fd = os.pipe()
+
+        for fd in (self._read_fd, self._write_fd):
+            set_cloexec(fd)
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        signal.signal(signal.SIGCHLD, self._handle_sigchld)
+        self.eventloop.add_reader(self._read_fd, self._ready)
+
+        # Children that terminated before the handler was installed.
+        self._reap()
+
+    def watch(self, pid, callback):
+        """
+        Call `callback(status)` when the child with this PID terminates.
+        `status` is the exit status as returned by `os.waitpid`.
+
+        This has to be called right after forking the child, in the event
+        loop. (The exit status of children that nobody watches is not kept,
+        because their PIDs can be reused by other processes.)
+        """
+        assert callable(callback)
+        self._callbacks[pid] = callback
+
+    def _handle_sigchld(self, signum, frame):
+        " Signal handler: wake up the event loop. "
+        try:
+            os.write(self._write_fd, b'x')
+        except OSError as e:
+            if e.errno != errno.EAGAIN:  # (Pipe is full, already woken up.)
+                raise
+
+    def _ready(self):
+        " Called by the event loop, after SIGCHLD. "
+        try:
+            os.read(self._read_fd, 1024)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+        self._reap()
+
+    def _reap(self):
+        " Collect the exit status of all terminated children. "
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                return  # ECHILD: No children.
+
+            if pid == 0:
+                return  # No more terminated children.
+
+            callback = self._callbacks.pop(pid, None)
+
+            if callback:
+                callback(status)
+            else:
+                logger.info('Child %i terminated with status %i.', pid, status)
+
+
+def exit_status_to_code(status):
+    """
+    Turn the status of `os.waitpid` into an exit code. (Like `returncode` of
+    `subprocess.Popen`: negative when the process was killed by a signal.)
+    `None` when the status is unknown.
+    """
+    if status is None:
+        return None
+    elif os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    else:
+        return os.WEXITSTATUS(status)
@@ -0,0 +1,394 @@
+"""
+Compact storage for the rows of a pane.
+
+Instead of storing a prompt_toolkit `Char` object for every cell, a row
+stores two parallel arrays: the code points of the characters and the style
+IDs of the cells. (Style IDs refer to the session-wide :class:`.StyleTable`.)
+`Char` instances are only created when a row is actually rendered.
+
+Rows that scrolled into the history are frozen into a :class:`FrozenRow`:
+the text and the run-length encoded styles. Identical frozen rows are shared.
+"""
+from __future__ import unicode_literals
+from array import array
+from bisect import bisect_right
+from itertools import groupby
+
+from prompt_toolkit.layout.screen import Char
+
+from .style import style_table
+
+import six
+import struct
+import sys
+import unicodedata
+import weakref
+import zlib
+
+__all__ = (
+    'Row',
+    'FrozenRow',
+    'BLANK_ROW',
+    'compress_rows',
+    'decompress_rows',
+)
+
+# Code point of a blank cell. Blank cells have style ID 0. (The default
+# style.)
+SPACE = 32
+
+# Style IDs are stored as unsigned shorts, unless a row contains a style ID
+# that doesn't fit. (The first parameter of 'array.array' needs to be 'str' on
+# both Python 2 and Python 3.)
+_CHARS_TYPECODE = str('I')
+_STYLES_TYPECODE = str('H')
+_MAX_SHORT_STYLE_ID = 0xffff
+
+
+class _CharCache(dict):
+    """
+    Cache of :class:`prompt_toolkit.layout.screen.Char` instances.
+    The key is the code point and the style ID, packed in one integer.
+    (It's cleared when it reaches `maxsize` entries.)
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+
+    def __missing__(self, key):
+        if len(self) >= self.maxsize:
+            self.clear()
+
+        c = Char(six.unichr(key & 0x1fffff), style_table.get_token(key >> 21))
+        self[key] = c
+        return c
+
+
+_CHAR_CACHE = _CharCache(maxsize=16384)
+style_table.register_cache(_CHAR_CACHE)
+_DEFAULT_CHAR = _CHAR_CACHE[SPACE]
+
+
+def _blanks(typecode, value, count):
+    return array(typecode, [value]) * count
+
+
+if six.PY2:
+    def _array_to_bytes(a):
+        return a.tostring()
+
+    def _array_from_bytes(typecode, data):
+        result = array(typecode)
+        result.fromstring(data)
+        return result
+
+    # Python 2 allows encoding lone surrogates by default.
+    _UTF8_ERRORS = 'strict'
+else:
+    def _array_to_bytes(a):
+        return a.tobytes()
+
+    def _array_from_bytes(typecode, data):
+        result = array(typecode)
+        result.frombytes(data)
+        return result
+
+    _UTF8_ERRORS = 'surrogatepass'
+
+
+class Row(object):
+    """
+    One row of a pane.
+
+    The cells after the end of the arrays are blank. Reading a cell through
+    `row[x]` returns a :class:`prompt_toolkit.layout.screen.Char`, this way
+    a row can be rendered like a row of a prompt_toolkit `Screen`.
+    """
+    __slots__ = ('chars', 'styles')
+    frozen = False
+
+    def __init__(self):
+        self.chars = array(_CHARS_TYPECODE)
+        self.styles = array(_STYLES_TYPECODE)
+
+    def __getitem__(self, x):
+        " Lazy adapter: return the prompt_toolkit `Char` at this position. "
+        try:
+            return _CHAR_CACHE[self.chars[x] | (self.styles[x] << 21)]
+        except IndexError:
+            return _DEFAULT_CHAR
+
+    def __len__(self):
+        " The amount of cells that are stored. (The rest is blank.) "
+        return len(self.chars)
+
+    def __repr__(self):
+        return 'Row(%r)' % (self.get_text(), )
+
+    def memory_usage(self):
+        " Approximate amount of bytes used by this row. "
+        return (_EMPTY_ROW_SIZE + len(self.chars) * self.chars.itemsize +
+                len(self.styles) * self.styles.itemsize)
+
+    def get_text(self):
+        " The text in this row. "
+        return ''.join(map(six.unichr, self.chars))
+
+    def freeze(self):
+        " Return an immutable (and shared) copy of this row. "
+        return FrozenRow.create(self.get_text(), tuple(self.get_style_runs()))
+
+    def get_style_ids(self):
+        " The set of style IDs in this row. "
+        return set(self.styles)
+
+    def _widen_styles(self, style_id):
+        " Make sure that this style ID fits in the styles array. "
+        if style_id > _MAX_SHORT_STYLE_ID and self.styles.typecode == _STYLES_TYPECODE:
+            self.styles = array(str('I'), self.styles)
+
+    def _pad(self, length):
+        " Add blank cells until the row has (at least) this length. "
+        missing = length - len(self.chars)
+
+        if missing > 0:
+            self.chars.extend(_blanks(_CHARS_TYPECODE, SPACE, missing))
+            self.styles.extend(_blanks(self.styles.typecode, 0, missing))
+
+    def set(self, x, char_code, style_id):
+        " Write one cell. "
+        chars = self.chars
+
+        if style_id > _MAX_SHORT_STYLE_ID:
+            self._widen_styles(style_id)
+
+        if x < len(chars):
+            chars[x] = char_code
+            self.styles[x] = style_id
+        else:
+            self._pad(x)
+            chars.append(char_code)
+            self.styles.append(style_id)
+
+    def combine(self, x, char):
+        """
+        Attach a combining character to the cell at this position. This only
+        works when both compose into a single code point. (We store one code
+        point per cell.) Otherwise, the combining character is dropped.
+        """
+        if 0 <= x < len(self.chars):
+            composed = unicodedata.normalize(
+                'NFC', six.unichr(self.chars[x]) + char)
+
+            if len(composed) == 1:
+                self.chars[x] = ord(composed)
+
+    def write_text(self, x, text, style_id):
+        " Write a string of single width characters, starting at this position. "
+        count = len(text)
+
+        if style_id > _MAX_SHORT_STYLE_ID:
+            self._widen_styles(style_id)
+
+        self._pad(x)
+        self.chars[x:x + count] = array(_CHARS_TYPECODE, map(ord, text))
+        self.styles[x:x + count] = _blanks(self.styles.typecode, style_id, count)
+
+    def insert_blanks(self, x, count, columns):
+        """
+        Insert blank cells at this position, shifting the following cells to
+        the right. Cells that are shifted beyond `columns` are lost.
+        """
+        if x < len(self.chars):
+            self.chars[x:x] = _blanks(_CHARS_TYPECODE, SPACE, count)
+            self.styles[x:x] = _blanks(self.styles.typecode, 0, count)
+            self.truncate(columns)
+
+    def delete_cells(self, x, count):
+        " Delete cells at this position, shifting the following cells to the left. "
+        del self.chars[x:x + count]
+        del self.styles[x:x + count]
+
+    def truncate(self, x):
+        " Erase all cells from this position until the end of the row. "
+        del self.chars[x:]
+        del self.styles[x:]
+
+    def clear_cells(self, start, end):
+        " Make the cells in this range blank, using the default style. "
+        end = min(end, len(self.chars))
+
+        if start < end:
+            self.chars[start:end] = _blanks(_CHARS_TYPECODE, SPACE, end - start)
+            self.styles[start:end] = _blanks(self.styles.typecode, 0, end - start)
+
+    def erase_text(self, start, end):
+        " Replace the characters in this range by spaces. (Keep the styles.) "
+        end = min(end, len(self.chars))
+
+        if start < end:
+            self.chars[start:end] = _blanks(_CHARS_TYPECODE, SPACE, end - start)
+
+    def get_style_runs(self):
+        " Return the styles as a list of (style_id, length) tuples. "
+        return [(style_id, len(list(cells))) for style_id, cells in groupby(self.styles)]
+
+    @classmethod
+    def from_text_and_style_runs(cls, text, style_runs):
+        " Create a row from its text and a list of (style_id, length) tuples. "
+        row = cls()
+        row.chars = array(_CHARS_TYPECODE, map(ord, text))
+
+        if any(style_id > _MAX_SHORT_STYLE_ID for style_id, _ in style_runs):
+            row._widen_styles(_MAX_SHORT_STYLE_ID + 1)
+
+        styles = row.styles
+        for style_id, length in style_runs:
+            styles.extend(_blanks(styles.typecode, style_id, length))
+
+        return row
+
+
+class FrozenRow(object):
+    """
+    Immutable row, for the rows in the history. It has the same interface for
+    reading as :class:`.Row`.
+
+    Don't call the constructor directly, use :meth:`create` instead, which
+    returns the existing instance for identical rows.
+
+    :param text: The text in this row.
+    :param style_runs: Tuple of (style_id, length) tuples.
+    """
+    __slots__ = ('text', 'style_runs', '_run_ends', '__weakref__')
+    frozen = True
+
+    def __init__(self, text, style_runs):
+        self.text = text
+        self.style_runs = style_runs
+
+        # For every run, the index of the cell after that run.
+        run_ends = []
+        end = 0
+        for _, length in style_runs:
+            end += length
+            run_ends.append(end)
+
+        self._run_ends = tuple(run_ends)
+
+    @classmethod
+    def create(cls, text, style_runs):
+        " Return the interned frozen row for this text and style runs. "
+        key = (text, style_runs)
+
+        try:
+            return _frozen_rows[key]
+        except KeyError:
+            row = cls(text, style_runs)
+            _frozen_rows[key] = row
+            return row
+
+    def __getitem__(self, x):
+        " Return the prompt_toolkit `Char` at this position. "
+        try:
+            char_code = ord(self.text[x])
+        except IndexError:
+            return _DEFAULT_CHAR
+
+        style_id = self.style_runs[bisect_right(self._run_ends, x)][0]
+        return _CHAR_CACHE[char_code | (style_id << 21)]
+
+    def __len__(self):
+        return len(self.text)
+
+    def __repr__(self):
+        return 'FrozenRow(%r)' % (self.text, )
+
+    def memory_usage(self):
+        " Approximate amount of bytes used by this row. "
+        return (sys.getsizeof(self) + sys.getsizeof(self.text) +
+                sys.getsizeof(self.style_runs) + sys.getsizeof(self._run_ends))
+
+    def get_text(self):
+        return self.text
+
+    def get_style_runs(self):
+        return self.style_runs
+
+    def get_style_ids(self):
+        return set(style_id for style_id, _ in self.style_runs)
+
+    def freeze(self):
+        return self
+
+    def thaw(self):
+        " Return a mutable copy of this row. "
+        return Row.from_text_and_style_runs(self.text, self.style_runs)
+
+
+# Mapping from (text, style_runs) to the `FrozenRow` instances that are in use.
+_frozen_rows = weakref.WeakValueDictionary()
+
+#: Shared, immutable empty row. Erased rows refer to this row, until they are
+#: written again.
+BLANK_ROW = FrozenRow.create('', ())
+
+
+_EMPTY_ROW_SIZE = (sys.getsizeof(Row()) + sys.getsizeof(array(_CHARS_TYPECODE)) +
+                   sys.getsizeof(array(_STYLES_TYPECODE)))
+
+
+def compress_rows(rows):
+    """
+    Encode a list of rows into a compressed byte string.
+
+    For every row, we store the amount of cells and the style runs in an
+    array of integers. The text of all rows is stored separately as UTF-8.
+    Both are compressed together with zlib.
+    """
+    meta = array(str('I'))
+    text = []
+
+    for row in rows:
+        style_runs = row.get_style_runs()
+        meta.append(len(row))
+        meta.append(len(style_runs))
+
+        for style_id, length in style_runs:
+            meta.append(style_id)
+            meta.append(length)
+
+        text.append(row.get_text())
+
+    meta_data = _array_to_bytes(meta)
+    text_data = ''.join(text).encode('utf-8', _UTF8_ERRORS)
+
+    return zlib.compress(struct.pack(str('I'), len(meta_data)) + meta_data + text_data)
+
+
+def decompress_rows(data):
+    """
+    Decode the rows from a byte string, created by :func:`compress_rows`.
+    This returns :class:`.FrozenRow` instances.
+    """
+    data = zlib.decompress(data)
+    meta_start = struct.calcsize(str('I'))
+    text_start = meta_start + struct.unpack(str('I'), data[:meta_start])[0]
+
+    meta = _array_from_bytes(str('I'), data[meta_start:text_start])
+    text = data[text_start:].decode('utf-8', _UTF8_ERRORS)
+
+    rows = []
+    i = 0
+    text_pos = 0
+
+    while i < len(meta):
+        cell_count, run_count = meta[i], meta[i + 1]
+        runs = meta[i + 2:i + 2 + 2 * run_count]
+        i += 2 + 2 * run_count
+
+        rows.append(FrozenRow.create(
+            text[text_pos:text_pos + cell_count],
+            tuple(zip(runs[::2], runs[1::2]))))
+        text_pos += cell_count
+
+    return rows
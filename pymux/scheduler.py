@@ -0,0 +1,211 @@
+"""
+Scheduling of the parsing of the output of the panes, and of the rendering.
+"""
+from __future__ import unicode_literals
+from collections import deque
+
+import datetime
+import threading
+import time
+
+__all__ = (
+    'OutputScheduler',
+    'FrameScheduler',
+)
+
+
+class OutputScheduler(object):
+    """
+    Parse the output of the processes that have pending output, in a fair way.
+
+    The processes only read their output when the pseudo terminal is
+    readable, but leave the (expensive) parsing to the scheduler. The
+    scheduler parses at most `chunk_size` characters of one process before
+    going to the next one (round robin), so that a process that floods its
+    output doesn't slow down the other panes.
+
+    The parsing is done as a low priority task of the event loop. That means
+    that when there is other I/O to handle, like client input, that is handled
+    first. Parsing is postponed at most `max_postpone` seconds. Further, we
+    return control to the event loop every `time_budget` seconds, so that key
+    strokes are never delayed for too long.
+
+    :param eventloop: The prompt_toolkit event loop.
+    :param chunk_size: Amount of characters to parse for one process in one
+        round.
+    :param time_budget: Maximum amount of seconds to parse without returning
+        to the event loop.
+    :param max_postpone: Maximum amount of seconds that parsing can be
+        postponed when the event loop is busy.
+    """
+    def __init__(self, eventloop, chunk_size=1024, time_budget=.02,
+                 max_postpone=.05):
+        assert chunk_size > 0
+
+        self.eventloop = eventloop
+        self.chunk_size = chunk_size
+        self.time_budget = time_budget
+        self.max_postpone = max_postpone
+
+        self._queue = deque()  # Processes with pending output.
+        self._scheduled = False
+
+    def schedule(self, process):
+        """
+        Parse the pending output of this process as soon as possible.
+        """
+        if process not in self._queue:
+            self._queue.append(process)
+
+        if not self._scheduled:
+            self._scheduled = True
+
+            max_postpone_until = datetime.datetime.now() + datetime.timedelta(
+                seconds=self.max_postpone)
+            self.eventloop.call_from_executor(
+                self._run, _max_postpone_until=max_postpone_until)
+
+    def _run(self):
+        " Parse pending output, round robin, until the time budget is used. "
+        self._scheduled = False
+        end_time = time.time() + self.time_budget
+        queue = self._queue
+
+        while queue and time.time() < end_time:
+            process = queue.popleft()
+
+            if process.process_output(self.chunk_size):
+                queue.append(process)
+
+        # Continue in the next iteration of the event loop.
+        if queue:
+            self.schedule(queue[0])
+
+
+class FrameScheduler(object):
+    """
+    Limit the amount of times per second that the clients are rendered.
+
+    All invalidations that happen within one frame are coalesced into one
+    call of `render`. When nothing was rendered during the last frame (for
+    instance, because the user was idle), `render` is called immediately, so
+    that typing doesn't get any latency.
+
+    Postponed frames are started by a timer thread. (One thread, that is
+    reused for every frame.)
+
+    :param eventloop: The prompt_toolkit event loop.
+    :param render: Callable that invalidates the clients. It receives the set
+        of clients to invalidate, or `None` for all clients.
+    :param get_fps: Callable that returns the maximum amount of frames per
+        second. (Zero means no limit.)
+    :param max_latency: When the event loop is busy, the rendering of a
+        postponed frame can be delayed, but at most this amount of seconds.
+    """
+    def __init__(self, eventloop, render, get_fps, max_latency=.1):
+        assert callable(render)
+        assert callable(get_fps)
+
+        self.eventloop = eventloop
+        self.render = render
+        self.get_fps = get_fps
+        self.max_latency = max_latency
+
+        self._last_render = 0
+        self._pending = False
+        self._rendering = False
+        self._dirty = False  # Invalidated while rendering.
+        self._clients = set()  # The clients to invalidate in the next frame.
+        self._all_clients = False
+
+        # The timer for postponed frames.
+        self._condition = threading.Condition()
+        self._deadline = None
+        self._thread = None
+
+    @property
+    def rendering(self):
+        " True while `render` is being called. "
+        return self._rendering
+
+    def invalidate(self, clients=None):
+        """
+        Render in the next frame.
+
+        :param clients: The clients to invalidate. (All of them when `None`.)
+        """
+        if clients is None:
+            self._all_clients = True
+        else:
+            self._clients.update(clients)
+
+        # Render again when the current frame is done.
+        if self._rendering:
+            self._dirty = True
+            return
+
+        if self._pending:
+            return
+
+        fps = self.get_fps()
+        now = time.time()
+        delay = self._last_render + 1. / fps - now if fps else 0
+
+        if delay <= 0:
+            self._render()
+        else:
+            self._pending = True
+            self._start_timer(now + delay)
+
+    def _start_timer(self, deadline):
+        " Render at this time. "
+        with self._condition:
+            self._deadline = deadline
+            self._condition.notify()
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run_timer)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run_timer(self):
+        " Wait for the deadline of the next frame, in the timer thread. "
+        condition = self._condition
+
+        while True:
+            with condition:
+                while True:
+                    if self._deadline is None:
+                        condition.wait()
+                    else:
+                        timeout = self._deadline - time.time()
+                        if timeout <= 0:
+                            break
+                        condition.wait(timeout)
+
+                self._deadline = None
+
+            max_postpone_until = datetime.datetime.now() + datetime.timedelta(
+                seconds=self.max_latency)
+            self.eventloop.call_from_executor(
+                self._render, _max_postpone_until=max_postpone_until)
+
+    def _render(self):
+        clients = None if self._all_clients else self._clients
+
+        self._pending = False
+        self._dirty = False
+        self._clients = set()
+        self._all_clients = False
+        self._last_render = time.time()
+        self._rendering = True
+
+        try:
+            self.render(clients)
+        finally:
+            self._rendering = False
+
+        # Invalidated while rendering: schedule the next frame.
+        if self._dirty:
+            self._dirty = False
+            self.invalidate(set())
@@ -8,29 +8,39 @@ Changes compared to the original `Screen` class:
     - CPR support and device attributes.
 """
 from __future__ import unicode_literals
-from collections import defaultdict
 
 from pygments.formatters.terminal256 import Terminal256Formatter
 from pyte import charsets as cs
 from pyte import modes as mo
 from pyte.screens import Margins
-from wcwidth import wcwidth
 
 from prompt_toolkit.layout.screen import Screen, Char
-from prompt_toolkit.styles import Attrs
 from prompt_toolkit.terminal.vt100_output import FG_ANSI_COLORS, BG_ANSI_COLORS
-from prompt_toolkit.utils import get_cwidth
 from collections import namedtuple
 
+from .row import Row, BLANK_ROW, SPACE
+from .scrollback import ScrollbackBuffer
+from .style import DEFAULT_ATTRS, DEFAULT_TOKEN, style_table
+from .utils import LRUCache
+from .width import get_char_width
+
 import copy
+import re
 
 __all__ = (
     'BetterScreen',
+    'Damage',
     'DEFAULT_TOKEN',
 )
 
-DEFAULT_TOKEN = ('C', ) + Attrs(color=None, bgcolor=None, bold=False, underline=False,
-                                italic=False, blink=False, reverse=False)
+
+#: Maps (current style ID, SGR parameters) to the new style ID. (Style IDs are
+#: session-wide, so this cache is shared by all screens.)
+sgr_cache = LRUCache(maxsize=1024)
+style_table.register_cache(sgr_cache)
+
+# Splits a run of text in printable ASCII parts and single other characters.
+_ASCII_OR_OTHER_RE = re.compile(r'([\x20-\x7e]+)|(.)', re.DOTALL)
 
 
 class CursorPosition(object):
@@ -43,7 +53,7 @@ class CursorPosition(object):
         return 'pymux.CursorPosition(x=%r, y=%r)' % (self.x, self.y)
 
 
-# Custom Savepoint that also stores the Attrs.
+# Custom Savepoint that also stores the style. (The style ID of the Attrs.)
 _Savepoint = namedtuple("_Savepoint", [
     'cursor',
     'g0_charset',
@@ -51,10 +61,28 @@ _Savepoint = namedtuple("_Savepoint", [
     'charset',
     'origin',
     'wrap',
-    'attrs',
+    'style_id',
 ])
 
 
+class Damage(namedtuple('Damage', ['rows', 'all', 'cursor', 'title', 'mode'])):
+    """
+    Changes to a :class:`.BetterScreen`, as returned by
+    :meth:`.BetterScreen.consume_damage`.
+
+    :param rows: Set of the absolute line numbers of the rows that changed.
+        (Subtract `line_offset` to get the position on the screen. Scrolling
+        the whole screen only changes `line_offset`, not the rows.)
+    :param all: True when everything has to be redrawn. (After a reset, a
+        resize, switching to or from the alternate screen or clearing the
+        history.) In that case, `rows` is empty.
+    :param cursor: True when the cursor position or visibility changed.
+    :param title: True when the title changed.
+    :param mode: True when the terminal modes changed.
+    """
+    __slots__ = ()
+
+
 class BetterScreen(object):
     """
     Custom screen class. Most of the methods are called from a vt100 Pyte
@@ -62,7 +90,9 @@ class BetterScreen(object):
 
     The data buffer is stored in a :class:`prompt_toolkit.layout.screen.Screen`
     class, because this way, we can send it to the renderer without any
-    transformation.
+    transformation. (The `data_buffer` of this screen is replaced by a
+    :class:`.ScrollbackBuffer` of :class:`.Row` instances, which have the same
+    interface for reading.)
     """
     swap_variables = [
         'mode',
@@ -77,15 +107,20 @@ class BetterScreen(object):
     ]
 
     def __init__(self, lines, columns, write_process_input, bell_func=None,
-                 get_history_limit=None):
+                 get_history_limit=None, get_history_compress_after=None,
+                 get_history_file_backed=None):
         assert isinstance(lines, int)
         assert isinstance(columns, int)
         assert callable(write_process_input)
         assert bell_func is None or callable(bell_func)
         assert get_history_limit is None or callable(get_history_limit)
+        assert get_history_compress_after is None or callable(get_history_compress_after)
+        assert get_history_file_backed is None or callable(get_history_file_backed)
 
         bell_func = bell_func or (lambda: None)
         get_history_limit = get_history_limit or (lambda: 2000)
+        get_history_compress_after = get_history_compress_after or (lambda: 1000)
+        get_history_file_backed = get_history_file_backed or (lambda: False)
 
         self.savepoints = []
         self.lines = lines
@@ -93,8 +128,23 @@ class BetterScreen(object):
         self.write_process_input = write_process_input
         self.bell_func = bell_func
         self.get_history_limit = get_history_limit
+        self.get_history_compress_after = get_history_compress_after
+        self.get_history_file_backed = get_history_file_backed
+
+        # The cursor, title and mode, as they were during the last call of
+        # `consume_damage`.
+        self._last_damage_state = (None, None, None)
+
+        #: The amount of lines that scrolled up, since the screen was created.
+        #: (This keeps counting after a reset, a clear or a switch to the
+        #: alternate screen.)
+        self.scrolled_line_count = 0
+
         self.reset()
 
+        # The style IDs in this screen should not be freed.
+        style_table.register(self)
+
     def __after__(self, ev):
         self.pt_screen.height = max(
             self.pt_screen.height, self.pt_screen.cursor_position.y + 2)
@@ -184,20 +234,75 @@ class BetterScreen(object):
         """ Reset the Screen content. (also called when switching from/to
         alternate buffer. """
         self.pt_screen = Screen(default_char=Char(' ', DEFAULT_TOKEN))
+        self.pt_screen.data_buffer = ScrollbackBuffer(
+            Row, max_rows=self.get_history_limit() + self.lines,
+            blank_row=BLANK_ROW)
 
         self.pt_screen.cursor_position = CursorPosition(0, 0)
         self.pt_screen.show_cursor = True
 
         self.data_buffer = self.pt_screen.data_buffer
 
-        self._attrs = Attrs(color=None, bgcolor=None, bold=False,
-                            underline=False, italic=False, blink=False, reverse=False)
+        # The current style, as an ID in the session-wide style table. (This
+        # changes only through `select_graphic_rendition`, so we don't have to
+        # compute it for every character that we draw.)
+        self._style_id = 0
 
         self.margins = Margins(0, self.lines - 1)
 
         self.line_offset = 0  # Index of the line that's currently displayed on top.
         self.max_y = 0  # Max 'y' position to which is written.
 
+        # Damage tracking. (See `consume_damage`.) While everything is
+        # damaged, we don't track individual rows. That way, the set stays
+        # empty as long as nobody consumes the damage.
+        self._damaged_rows = set()
+        self._all_damaged = True
+
+    def _damage_row(self, y):
+        " Mark the row at this (absolute) line number as changed. "
+        if not self._all_damaged:
+            self._damaged_rows.add(y)
+
+    def _damage_rows(self, start, end):
+        " Mark the rows in the range [start, end) as changed. "
+        if not self._all_damaged:
+            self._damaged_rows.update(range(start, end))
+
+    def _damage_all(self):
+        " Mark everything as changed. "
+        self._all_damaged = True
+        self._damaged_rows = set()
+
+    def consume_damage(self):
+        """
+        Return a :class:`.Damage` instance that describes what changed since
+        the previous call, and start tracking from scratch again.
+        """
+        pt_screen = self.pt_screen
+        cursor_state = (pt_screen.cursor_position.x,
+                        pt_screen.cursor_position.y, pt_screen.show_cursor)
+        mode_state = frozenset(self.mode)
+        last_cursor_state, last_title, last_mode_state = self._last_damage_state
+
+        if self._all_damaged:
+            rows = set()
+        else:
+            rows = self._damaged_rows
+
+        damage = Damage(
+            rows=rows,
+            all=self._all_damaged,
+            cursor=cursor_state != last_cursor_state,
+            title=self.title != last_title,
+            mode=mode_state != last_mode_state)
+
+        self._damaged_rows = set()
+        self._all_damaged = False
+        self._last_damage_state = (cursor_state, self.title, mode_state)
+
+        return damage
+
     def resize(self, lines=None, columns=None):
         # don't do anything except saving the dimensions
         lines = lines if lines is not None else self.lines
@@ -212,6 +317,7 @@ class BetterScreen(object):
             self.columns = columns
 
             self._reset_offset_and_margins()
+            self._damage_all()
 
     def set_margins(self, top=None, bottom=None):
         """Selects top and bottom margins for the scrolling region.
@@ -256,6 +362,25 @@ class BetterScreen(object):
         elif self.data_buffer:
             self.line_offset = max(0, self.max_y - self.lines + 1)
 
+        # The buffer has to hold all the visible lines. (After clearing the
+        # history, the lines above `first_line` can become visible again when
+        # the screen grows.)
+        self.data_buffer.max_rows = self.get_history_limit() + self.lines
+        self.data_buffer.extend_back(self.line_offset)
+
+    def _get_row_for_writing(self, y):
+        """
+        Return the row at this (absolute) line number. If it was frozen (because
+        it scrolled into the history before), replace it by a mutable copy.
+        """
+        row = self.data_buffer[y]
+
+        if row.frozen:
+            row = row.thaw()
+            self.data_buffer[y] = row
+
+        return row
+
     def set_charset(self, code, mode):
         """Set active ``G0`` or ``G1`` charset.
 
@@ -340,6 +465,7 @@ class BetterScreen(object):
             self._original_screen = None
             self._original_screen_vars = {}
             self._reset_offset_and_margins()
+            self._damage_all()
 
     @property
     def _in_alternate_screen(self):
@@ -353,18 +479,79 @@ class BetterScreen(object):
         " Activates ``G1`` character set. "
         self.charset = 1
 
+    def _translate(self, text):
+        " Translate text using the current charset. "
+        charset = self.g1_charset if self.charset else self.g0_charset
+
+        # The default (Latin-1) charset maps every character to itself.
+        if charset is cs.LAT1_MAP:
+            return text
+        else:
+            return text.translate(charset)
+
     def draw(self, char):
+        self._draw_char(self._translate(char))
+
+    def draw_text(self, text):
+        """
+        Draw a run of printable characters. This does the same as calling
+        :meth:`draw` for every character, but ASCII text is written into the
+        rows as a whole, one slice per line.
+        """
+        for match in _ASCII_OR_OTHER_RE.finditer(self._translate(text)):
+            ascii_text, other_char = match.groups()
+
+            if ascii_text:
+                self._draw_ascii(ascii_text)
+            else:
+                self._draw_char(other_char)
+
+    def _draw_ascii(self, text):
+        " Draw a (translated) string of printable ASCII characters. "
         pt_screen = self.pt_screen
+        columns = self.columns
+        insert_mode = mo.IRM in self.mode
 
-        # Translating a given character.
-        if self.charset:
-            char = char.translate(self.g1_charset)
-        else:
-            char = char.translate(self.g0_charset)
+        while text:
+            cursor_position = pt_screen.cursor_position
 
-        # Calculate character width. (We use the prompt_toolkit function which
-        # has built-in caching.)
-        char_width = get_cwidth(char)
+            if cursor_position.x >= columns:
+                if mo.DECAWM in self.mode:
+                    self.carriage_return()
+                    self.linefeed()
+                else:
+                    # Without auto wrap, every character replaces the
+                    # previous one at the end of the line.
+                    for char in text:
+                        self._draw_char(char)
+                    return
+
+            # Write as much as fits on the current line.
+            x = cursor_position.x
+            count = min(len(text), columns - x)
+            row = self._get_row_for_writing(cursor_position.y)
+
+            if insert_mode:
+                row.insert_blanks(x, count, columns)
+
+            row.write_text(x, text[:count], self._style_id)
+            self._damage_row(cursor_position.y)
+            text = text[count:]
+
+            cursor_position.x += count
+            self.max_y = max(self.max_y, cursor_position.y)
+
+    def _draw_char(self, char):
+        " Draw one (translated) character. "
+        pt_screen = self.pt_screen
+        char_width = get_char_width(char)
+
+        # Combining characters are attached to the previous cell.
+        if char_width == 0:
+            row = self._get_row_for_writing(pt_screen.cursor_position.y)
+            row.combine(pt_screen.cursor_position.x - 1, char)
+            self._damage_row(pt_screen.cursor_position.y)
+            return
 
         # If this was the last column in a line and auto wrap mode is
         # enabled, move the cursor to the beginning of the next line,
@@ -383,12 +570,14 @@ class BetterScreen(object):
         if mo.IRM in self.mode:
             self.insert_characters(char_width)
 
-        token = ('C', ) + self._attrs
-        row = pt_screen.data_buffer[pt_screen.cursor_position.y]
-        row[pt_screen.cursor_position.x] = Char(char, token)
+        style_id = self._style_id
+        row = self._get_row_for_writing(pt_screen.cursor_position.y)
+        row.set(pt_screen.cursor_position.x, ord(char), style_id)
 
         if char_width > 1:
-            row[pt_screen.cursor_position.x + 1] = Char(' ', token)
+            row.set(pt_screen.cursor_position.x + 1, SPACE, style_id)
+
+        self._damage_row(pt_screen.cursor_position.y)
 
         # .. note:: We can't use :meth:`cursor_forward()`, because that
         #           way, we'll never know when to linefeed.
@@ -409,14 +598,20 @@ class BetterScreen(object):
         # When scrolling over the full screen height -> keep history.
         if top == 0 and bottom >= self.lines - 1:
             if self.pt_screen.cursor_position.y >= self.line_offset + self.lines - 1:
+                # The top row scrolls into the history, it won't change
+                # anymore.
+                self.data_buffer[self.line_offset] = \
+                    self.data_buffer[self.line_offset].freeze()
+                self._damaged_rows.discard(self.line_offset)
                 self.line_offset += 1
+                self.scrolled_line_count += 1
             self.cursor_down()
         else:
             if self.pt_screen.cursor_position.y - self.line_offset == bottom:
-                for line in range(top, bottom):
-                    self.data_buffer[line + self.line_offset] = \
-                        self.data_buffer[line + self.line_offset + 1]
-                    del self.data_buffer[line + self.line_offset + 1]
+                self.data_buffer.scroll(
+                    top + self.line_offset, bottom + self.line_offset + 1, 1)
+                self._damage_rows(top + self.line_offset, bottom + self.line_offset + 1)
+                self.scrolled_line_count += 1
             else:
                 self.cursor_down()
 
@@ -425,20 +620,67 @@ class BetterScreen(object):
     def _remove_old_lines_from_history(self):
         """
         Remove top from the scroll buffer. (Outside bounds of history limit.)
+
+        The ring buffer evicts the oldest lines by itself, we only have to
+        keep its size in sync with the history limit. Lines that are far
+        enough above the visible area are compressed. (And written to a file,
+        if the history is file backed.)
         """
-        remove_above = max(0, self.pt_screen.cursor_position.y - self.get_history_limit())
-        data_buffer = self.pt_screen.data_buffer
-        for line in list(data_buffer):
-            if line < remove_above:
-                del data_buffer[line]
+        self.data_buffer.max_rows = self.get_history_limit() + self.lines
+        self.data_buffer.compress_before(
+            self.line_offset - self.get_history_compress_after(),
+            file_backed=self.get_history_file_backed())
 
     def clear_history(self):
         """
         Delete all history from the scroll buffer.
         """
-        for line in list(self.data_buffer):
-            if line < self.line_offset:
-                del self.data_buffer[line]
+        self.data_buffer.drop_before(self.line_offset)
+        self._damage_all()
+
+    def _get_main_buffer(self):
+        """
+        Return the (data_buffer, line_offset) tuple of the main screen. (Also
+        when the alternate screen is active, that has no history of its own.)
+        """
+        if self._in_alternate_screen:
+            return (self._original_screen_vars['data_buffer'],
+                    self._original_screen_vars['line_offset'])
+        else:
+            return self.data_buffer, self.line_offset
+
+    @property
+    def history_size(self):
+        " The amount of lines in the history. "
+        data_buffer, line_offset = self._get_main_buffer()
+        return max(0, line_offset - data_buffer.first_line)
+
+    def trim_history(self, count):
+        """
+        Delete the oldest `count` lines from the history.
+        """
+        data_buffer, line_offset = self._get_main_buffer()
+        data_buffer.drop_before(min(data_buffer.first_line + count, line_offset))
+
+    def get_style_ids(self):
+        " The set of style IDs that are used by this screen. "
+        result = set([self._style_id])
+        result.update(s.style_id for s in self.savepoints)
+        result.update(self.data_buffer.get_style_ids())
+
+        if self._in_alternate_screen:
+            result.update(self._original_screen_vars['data_buffer'].get_style_ids())
+
+        return result
+
+    def memory_usage(self):
+        " Approximate amount of bytes used by the rows of this screen. "
+        usage = self.data_buffer.memory_usage()
+
+        if self._in_alternate_screen:
+            usage += self._original_screen_vars['data_buffer'].memory_usage()
+
+        return usage
 
     def reverse_index(self):
         top, bottom = self.margins
@@ -446,9 +688,8 @@ class BetterScreen(object):
 
         # When scrolling over the full screen -> keep history.
         if self.pt_screen.cursor_position.y - line_offset == top:
-            for i in range(bottom - 1, top - 1, -1):
-                self.data_buffer[i + line_offset + 1] = self.data_buffer[i + line_offset]
-                del self.data_buffer[i + line_offset]
+            self.data_buffer.scroll(top + line_offset, bottom + line_offset + 1, -1)
+            self._damage_rows(top + line_offset, bottom + line_offset + 1)
         else:
             self.cursor_up()
 
@@ -498,7 +739,7 @@ class BetterScreen(object):
             self.charset,
             mo.DECOM in self.mode,
             mo.DECAWM in self.mode,
-            self._attrs))
+            self._style_id))
 
     def restore_cursor(self):
         """Set the current cursor position to whatever cursor is on top
@@ -510,7 +751,7 @@ class BetterScreen(object):
             self.g0_charset = savepoint.g0_charset
             self.g1_charset = savepoint.g1_charset
             self.charset = savepoint.charset
-            self._attrs = savepoint.attrs
+            self._style_id = savepoint.style_id
 
             if savepoint.origin:
                 self.set_mode(mo.DECOM)
@@ -537,12 +778,9 @@ class BetterScreen(object):
 
         # If cursor is outside scrolling margins it -- do nothing.
         if top <= self.pt_screen.cursor_position.y - self.line_offset <= bottom:
-            for line in range(bottom, self.pt_screen.cursor_position.y - self.line_offset, -1):
-                if line - count < top:
-                    del self.data_buffer[line + self.line_offset]
-                else:
-                    self.data_buffer[line + self.line_offset] = self.data_buffer[line + self.line_offset - count]
-                    del self.data_buffer[line + self.line_offset - count]
+            self.data_buffer.scroll(
+                self.pt_screen.cursor_position.y, bottom + self.line_offset + 1, -count)
+            self._damage_rows(self.pt_screen.cursor_position.y, bottom + self.line_offset + 1)
 
             self.carriage_return()
 
@@ -559,15 +797,11 @@ class BetterScreen(object):
 
         # If cursor is outside scrolling margins it -- do nothin'.
         if top <= self.pt_screen.cursor_position.y - self.line_offset <= bottom:
-            # Iterate from the cursor Y position until the end of the visible input.
-            for line in range(self.pt_screen.cursor_position.y - self.line_offset, bottom + 1):
-
-                # When 'x' lines further are out of the margins, replace by an empty line,
-                # Otherwise copy the line from there.
-                if line + count > bottom:
-                    del self.data_buffer[line + self.line_offset]
-                else:
-                    self.data_buffer[line + self.line_offset] = self.data_buffer[line + count + self.line_offset]
+            # Move the lines below the cursor up. Empty lines come in at the
+            # bottom of the scrolling region.
+            self.data_buffer.scroll(
+                self.pt_screen.cursor_position.y, bottom + self.line_offset + 1, count)
+            self._damage_rows(self.pt_screen.cursor_position.y, bottom + self.line_offset + 1)
 
     def insert_characters(self, count=None):  # XXX: used by pressing space in bash vi mode
         """Inserts the indicated # of blank characters at the cursor
@@ -579,25 +813,16 @@ class BetterScreen(object):
         """
         count = count or 1
 
-        line = self.data_buffer[self.pt_screen.cursor_position.y]
-
-        if line:
-            max_columns = max(line.keys())
-
-            for i in range(max_columns, self.pt_screen.cursor_position.x - 1, -1):
-                line[i + count] = line[i]
-                del line[i]
+        line = self._get_row_for_writing(self.pt_screen.cursor_position.y)
+        line.insert_blanks(self.pt_screen.cursor_position.x, count, self.columns)
+        self._damage_row(self.pt_screen.cursor_position.y)
 
     def delete_characters(self, count=None):
         count = count or 1
 
-        line = self.data_buffer[self.pt_screen.cursor_position.y]
-        if line:
-            max_columns = max(line.keys())
-
-            for i in range(self.pt_screen.cursor_position.x, max_columns + 1):
-                line[i] = line[i + count]
-                del line[i + count]
+        line = self._get_row_for_writing(self.pt_screen.cursor_position.y)
+        line.delete_cells(self.pt_screen.cursor_position.x, count)
+        self._damage_row(self.pt_screen.cursor_position.y)
 
     def cursor_position(self, line=None, column=None):
         """Set the cursor to a specific `line` and `column`.
@@ -692,8 +917,8 @@ class BetterScreen(object):
         self.ensure_bounds()
 
     def _set_char(self, x, y, data):
-        token = ('C', ) + self._attrs
-        self.pt_screen.data_buffer[y + self.line_offset][x] = Char(data, token)
+        self._get_row_for_writing(y + self.line_offset).set(x, ord(data), self._style_id)
+        self._damage_row(y + self.line_offset)
 
     def erase_characters(self, count=None):
         """Erases the indicated # of characters, starting with the
@@ -711,11 +936,11 @@ class BetterScreen(object):
         """
         count = count or 1
         cursor_position = self.pt_screen.cursor_position
-        row = self.data_buffer[cursor_position.y]
+        row = self._get_row_for_writing(cursor_position.y)
 
-        for column in range(cursor_position.x,
-                            min(cursor_position.x + count, self.columns)):
-            row[column] = Char(token=row[column].token)
+        row.erase_text(cursor_position.x,
+                       min(cursor_position.x + count, self.columns))
+        self._damage_row(cursor_position.y)
 
     def erase_in_line(self, type_of=0, private=False):
         """Erases a line in a specific way.
@@ -730,21 +955,17 @@ class BetterScreen(object):
         :param bool private: when ``True`` character attributes aren left
                              unchanged **not implemented**.
         """
-        if type_of == 2:
-            # Delete line completely.
-            del self.data_buffer[self.pt_screen.cursor_position.y]
-        else:
-            line = self.data_buffer[self.pt_screen.cursor_position.y]
+        cursor_position = self.pt_screen.cursor_position
 
-            def should_we_delete(column):  # TODO: check for off-by-one errors!
-                if type_of == 0:
-                    return column >= self.pt_screen.cursor_position.x
-                if type_of == 1:
-                    return column <= self.pt_screen.cursor_position.x
+        if type_of == 2 or (type_of == 0 and cursor_position.x == 0):
+            # Delete line completely. (It becomes the shared blank row.)
+            del self.data_buffer[cursor_position.y]
+        elif type_of == 0:
+            self._get_row_for_writing(cursor_position.y).truncate(cursor_position.x)
+        elif type_of == 1:
+            self._get_row_for_writing(cursor_position.y).clear_cells(0, cursor_position.x + 1)
 
-            for column in list(line.keys()):
-                if should_we_delete(column):
-                    del line[column]
+        self._damage_row(cursor_position.y)
 
     def erase_in_display(self, type_of=0, private=False):
         """Erases display in a specific way.
@@ -763,29 +984,30 @@ class BetterScreen(object):
         """
         if type_of == 3:
             # Clear data buffer.
-            for y in list(self.data_buffer):
-                del self.data_buffer[y]
+            self.data_buffer.clear()
 
             # Reset line_offset.
             self.pt_screen.cursor_position.y -= self.line_offset
             self.line_offset = 0
+            self._damage_all()
         else:
             try:
-                interval = (
+                start, end = (
                     # a) erase from cursor to the end of the display, including
                     # the cursor,
-                    range(self.pt_screen.cursor_position.y + 1, self.line_offset + self.lines),
+                    (self.pt_screen.cursor_position.y + 1, self.line_offset + self.lines),
                     # b) erase from the beginning of the display to the cursor,
                     # including it,
-                    range(self.line_offset, self.pt_screen.cursor_position.y),
+                    (self.line_offset, self.pt_screen.cursor_position.y),
                     # c) erase the whole display.
-                    range(self.line_offset, self.line_offset + self.lines)
+                    (self.line_offset, self.line_offset + self.lines)
                 )[type_of]
             except IndexError:
                 return
 
-            for line in interval:
-                self.data_buffer[line] = defaultdict(lambda: Char(' '))
+            # All erased rows refer to the same blank row.
+            self.data_buffer.erase(start, end)
+            self._damage_rows(start, end)
 
             # In case of 0 or 1 we have to erase the line with the cursor.
             if type_of in [0, 1]:
@@ -830,9 +1052,11 @@ class BetterScreen(object):
 
     def alignment_display(self):
         for y in range(0, self.lines):
-            line = self.data_buffer[y + self.line_offset]
+            line = self._get_row_for_writing(y + self.line_offset)
             for x in range(0, self.columns):
-                line[x] = Char('E')
+                line.set(x, ord('E'), 0)
+
+        self._damage_rows(self.line_offset, self.line_offset + self.lines)
 
     # Mapping of the ANSI color codes to their names.
     _fg_colors = dict((v, k) for k, v in FG_ANSI_COLORS.items())
@@ -846,7 +1070,20 @@ class BetterScreen(object):
 
     def select_graphic_rendition(self, *attrs):
         """ Support 256 colours """
+        # The same few SGR sequences are used over and over again, so we
+        # cache the resulting style ID.
+        key = (self._style_id, attrs)
+        style_id = sgr_cache.get(key)
+
+        if style_id is None:
+            style_id = sgr_cache[key] = self._get_sgr_style_id(attrs)
+
+        self._style_id = style_id
+
+    def _get_sgr_style_id(self, attrs):
+        " Compute the style ID after applying these SGR parameters. "
         replace = {}
+        current_attrs = style_table.get_attrs(self._style_id)
 
         if not attrs:
             attrs = [0]
@@ -884,8 +1121,7 @@ class BetterScreen(object):
                 replace["reverse"] = False
             elif not attr:
                 replace = {}
-                self._attrs = Attrs(color=None, bgcolor=None, bold=False,
-                                    underline=False, italic=False, blink=False, reverse=False)
+                current_attrs = DEFAULT_ATTRS
 
             elif attr in (38, 48):
                 n = attrs.pop()
@@ -911,7 +1147,9 @@ class BetterScreen(object):
                         elif attr == 48:
                             replace["bgcolor"] = color_str
 
-        self._attrs = self._attrs._replace(**replace)
+        # Look up the style ID once, the cells only refer to this ID.
+        return style_table.get_style_id_for_attrs(
+            current_attrs._replace(**replace))
 
     def square_close(self, data):
         # Xterm title / icon name.
@@ -0,0 +1,611 @@
+"""
+Scrollback storage for the pane screens.
+
+The rows of a pane (history and visible area) are stored in a ring buffer,
+addressed by their absolute line number. This replaces the dictionary that
+prompt_toolkit uses for the `data_buffer` of a `Screen`: the oldest lines
+are evicted in constant time when new lines are added, instead of walking
+over the whole history after every line feed.
+
+The oldest part of the history can be frozen into compressed blocks (the
+cold tier). These rows are only decompressed when they are read again, for
+instance by copy mode. The compressed blocks are kept in memory, or, for
+huge history limits, in a file that is read back through `mmap`.
+"""
+from __future__ import unicode_literals
+
+from .row import compress_rows, decompress_rows
+
+import mmap
+import os
+import sys
+import tempfile
+
+__all__ = (
+    'ScrollbackBuffer',
+)
+
+
+class _MemoryBlockStore(object):
+    " Keep the compressed blocks in memory. The key is the data itself. "
+    def add(self, data):
+        return data
+
+    def get(self, key):
+        return key
+
+    def remove(self, key):
+        pass
+
+    def memory_usage(self, key):
+        return sys.getsizeof(key)
+
+
+class _FileBlockStore(object):
+    """
+    Store the compressed blocks in an append-only file, which is read back
+    through `mmap`.
+
+    The file is created in the runtime directory and unlinked immediately,
+    so that it disappears together with the server process. When more than
+    half of the file consists of removed blocks, the live blocks are copied
+    into a new file.
+
+    :param directory: Directory for the file. (`$XDG_RUNTIME_DIR` or the
+        temp directory by default.)
+    """
+    # Don't bother compacting files smaller than this.
+    _MIN_COMPACT_SIZE = 1024 * 1024
+
+    def __init__(self, directory=None):
+        self.directory = (directory or os.environ.get('XDG_RUNTIME_DIR') or
+                          tempfile.gettempdir())
+
+        self._locations = {}  # Maps key to (offset, length) in the file.
+        self._next_key = 0
+        self.live_bytes = 0
+        self._open_file()
+
+    def _open_file(self):
+        fd, path = tempfile.mkstemp(prefix='pymux-history.', dir=self.directory)
+        os.unlink(path)
+
+        self._file = os.fdopen(fd, 'w+b')
+        self._size = 0
+        self._mmap = None
+
+    def _close_file(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def add(self, data):
+        key = self._next_key
+        self._next_key += 1
+
+        self._file.seek(self._size)
+        self._file.write(data)
+        self._file.flush()
+
+        self._locations[key] = (self._size, len(data))
+        self._size += len(data)
+        self.live_bytes += len(data)
+        return key
+
+    def get(self, key):
+        offset, length = self._locations[key]
+
+        # Map the file again when it has grown.
+        if self._mmap is None or offset + length > len(self._mmap):
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self._file.fileno(), self._size,
+                                   access=mmap.ACCESS_READ)
+
+        return self._mmap[offset:offset + length]
+
+    def memory_usage(self, key):
+        # The data lives in the file, not in the memory of the process.
+        return 0
+
+    def remove(self, key):
+        offset, length = self._locations.pop(key)
+        self.live_bytes -= length
+
+        if not self._locations:
+            self._close_file()
+            self._open_file()
+
+        elif self._size > max(2 * self.live_bytes, self._MIN_COMPACT_SIZE):
+            self._compact()
+
+    def _compact(self):
+        " Copy the live blocks into a new file. "
+        blocks = [(key, self.get(key)) for key in sorted(self._locations)]
+
+        self._close_file()
+        self._open_file()
+        self.live_bytes = 0
+
+        for key, data in blocks:
+            self._file.write(data)
+            self._locations[key] = (self._size, len(data))
+            self._size += len(data)
+            self.live_bytes += len(data)
+
+        self._file.flush()
+
+
+_memory_block_store = _MemoryBlockStore()
+
+
+class _CompressedBlock(object):
+    """
+    A range of rows in the cold tier of the scrollback buffer.
+
+    :param first_line: Absolute line number of the first row.
+    :param rows: List of rows to compress.
+    :param store: The block store that keeps the compressed data.
+    """
+    __slots__ = ('first_line', 'count', 'store', 'key', 'style_ids')
+
+    def __init__(self, first_line, rows, store):
+        self.first_line = first_line
+        self.count = len(rows)
+        self.store = store
+        self.key = store.add(compress_rows(rows))
+
+        # The style IDs in these rows. (So that they are not freed.)
+        self.style_ids = frozenset().union(*[row.get_style_ids() for row in rows])
+
+    @property
+    def end(self):
+        " The line number after the last row in this block. "
+        return self.first_line + self.count
+
+    def decompress(self):
+        return decompress_rows(self.store.get(self.key))
+
+    def release(self):
+        " Remove the data from the store. "
+        self.store.remove(self.key)
+
+    def memory_usage(self):
+        " Approximate amount of bytes used by this block. "
+        return _BLOCK_OVERHEAD + self.store.memory_usage(self.key)
+
+
+_BLOCK_OVERHEAD = sys.getsizeof(_CompressedBlock(0, [], _memory_block_store))
+
+
+class ScrollbackBuffer(object):
+    """
+    Bounded ring buffer of rows, with the same row-access interface as the
+    `data_buffer` of a :class:`prompt_toolkit.layout.screen.Screen`.
+
+    Rows are addressed by their absolute line number. Only the lines in the
+    range `[first_line, end)` are stored. Accessing a line after the end will
+    extend the buffer (like a `defaultdict`), evicting the oldest lines when
+    `max_rows` is reached. Accessing a line before `first_line` returns a
+    blank row that is not stored, and assigning to it does nothing. (Use
+    :meth:`extend_back` to store these lines again.)
+
+    Rows that are moved to the cold tier by :meth:`compress_before` are
+    read-only: reading them returns a decompressed copy. (Assigning a row to
+    such a line moves its block back to the ring buffer.)
+
+    :param create_row: Callable that returns a new, blank row.
+    :param max_rows: Maximum number of rows to keep.
+    :param block_size: Amount of rows in one compressed block.
+    :param blank_row: Immutable blank row, shared by all the rows that are
+        erased or scrolled in. When not given, `create_row` is used instead.
+    """
+    def __init__(self, create_row, max_rows=2000, block_size=256, blank_row=None):
+        assert callable(create_row)
+        assert isinstance(max_rows, int)
+        assert isinstance(block_size, int) and block_size > 0
+
+        self.create_row = create_row
+        self.block_size = block_size
+        self.blank_row = blank_row
+
+        #: Absolute line number of the oldest row in the buffer.
+        self.first_line = 0
+
+        # The cold tier: a list of compressed blocks of `block_size` rows,
+        # covering the lines until `_hot_first`. (The first block can start
+        # before `first_line`, when its oldest rows were evicted already.)
+        self._cold = []
+        self._decompressed = (None, None)  # Last (block, rows) that we read.
+        self._file_store = None  # Created when the first block goes to a file.
+
+        # The hot tier: a ring buffer of rows, starting at `_hot_first`.
+        # As long as the buffer did not reach `max_rows`, `_rows` is a plain
+        # list and `_start` is zero. When it's full (and there are no
+        # compressed rows to evict), new rows overwrite the oldest ones and
+        # `_start` points to the physical index of `_hot_first`.
+        self._hot_first = 0
+        self._rows = []
+        self._start = 0
+        self._max_rows = max(1, max_rows)
+
+        # Amount of bytes used by the stored rows and blocks. This is updated
+        # on every change, so that reading it doesn't walk over the history.
+        # (Mutable rows are modified in place after they were stored, so they
+        # are counted at the size of a blank row. These are the rows of the
+        # visible area; the rows in the history are frozen.)
+        self._memory_usage = 0
+        self._mutable_row_size = create_row().memory_usage()
+
+    @property
+    def end(self):
+        " The line number after the last row in the buffer. "
+        return self._hot_first + len(self._rows)
+
+    @property
+    def max_rows(self):
+        " The maximum amount of rows in this buffer. "
+        return self._max_rows
+
+    @max_rows.setter
+    def max_rows(self, value):
+        value = max(1, value)
+
+        if value != self._max_rows:
+            self._linearize()
+
+            # Evict the oldest rows, when there are too many.
+            self.drop_before(self.end - value)
+            self._max_rows = value
+
+    def _linearize(self):
+        " Reorder the underlying list, so that `_start` becomes zero. "
+        if self._start:
+            rows = self._rows
+            self._rows = rows[self._start:] + rows[:self._start]
+            self._start = 0
+
+    def _row_memory_usage(self, row):
+        if row.frozen:
+            return row.memory_usage()
+        else:
+            return self._mutable_row_size
+
+    def _rows_memory_usage(self, rows):
+        return sum(map(self._row_memory_usage, rows))
+
+    def _append(self, row):
+        " Add a row at the end. Evict the oldest row when the buffer is full. "
+        rows = self._rows
+        self._memory_usage += self._row_memory_usage(row)
+
+        if self.end - self.first_line < self._max_rows:
+            rows.append(row)
+        elif self._cold:
+            # Evict a compressed row instead.
+            rows.append(row)
+            self._drop_cold_before(self.first_line + 1)
+        else:
+            self._memory_usage -= self._row_memory_usage(rows[self._start])
+            rows[self._start] = row
+            self._start += 1
+            self._hot_first += 1
+            self.first_line += 1
+
+            if self._start == len(rows):
+                self._start = 0
+
+    def _drop_cold_before(self, line):
+        " Evict the compressed rows before this line number. "
+        cold = self._cold
+
+        while cold and cold[0].end <= line:
+            block = cold.pop(0)
+            self._memory_usage -= block.memory_usage()
+            block.release()
+
+        self.first_line = max(self.first_line, line)
+
+    def _extend_to(self, line):
+        " Make sure that `line` is stored in this buffer. "
+        missing = line - self.end + 1
+
+        if missing > self._max_rows:
+            # Everything that we have will be evicted anyway.
+            self.first_line = self._hot_first = line + 1 - self._max_rows
+            self._clear_cold()
+            self._rows = []
+            self._start = 0
+            self._memory_usage = 0
+            missing = self._max_rows
+
+        create_row = self.create_row
+        for _ in range(missing):
+            self._append(create_row())
+
+    def _physical_index(self, line):
+        " Index in `_rows` for this line number, or `None` when not stored. "
+        i = line - self._hot_first
+        count = len(self._rows)
+
+        if 0 <= i < count:
+            i += self._start
+            if i >= count:
+                i -= count
+            return i
+
+    def _get_blank_row(self):
+        if self.blank_row is None:
+            return self.create_row()
+        else:
+            return self.blank_row
+
+    def _get_range(self, start, end):
+        " Return the list of rows in the range [start, end). (All stored and hot.) "
+        rows = self._rows
+        i = self._physical_index(start)
+        j = i + end - start
+
+        if j <= len(rows):
+            return rows[i:j]
+        else:
+            return rows[i:] + rows[:j - len(rows)]
+
+    def _set_range(self, start, new_rows):
+        " Replace the rows, starting at this line number. (All stored and hot.) "
+        rows = self._rows
+        i = self._physical_index(start)
+        j = i + len(new_rows)
+
+        self._memory_usage += (
+            self._rows_memory_usage(new_rows) -
+            self._rows_memory_usage(self._get_range(start, start + len(new_rows))))
+
+        if j <= len(rows):
+            rows[i:j] = new_rows
+        else:
+            split = len(rows) - i
+            rows[i:] = new_rows[:split]
+            rows[:j - len(rows)] = new_rows[split:]
+
+    def scroll(self, start, end, count):
+        """
+        Scroll the rows in the range [start, end) up by `count` lines, or down
+        when `count` is negative. Rows that are scrolled out of the range are
+        discarded, blank rows come in at the other side.
+
+        This is one slice assignment on the underlying list, (two when the
+        range wraps around the end of the ring buffer) instead of moving the
+        rows one by one.
+        """
+        if end <= start or count == 0:
+            return
+
+        self._extend_to(end - 1)
+
+        # The evicted lines are blank and stay blank. (When the range is
+        # larger than `max_rows`, extending can evict the top of the range.)
+        start = max(start, self.first_line)
+        size = end - start
+        count = max(-size, min(size, count))
+
+        if size <= 0:
+            return
+
+        self.decompress_from(start)
+
+        rows = self._get_range(start, end)
+        blanks = [self._get_blank_row() for _ in range(abs(count))]
+
+        if count > 0:
+            rows = rows[count:] + blanks
+        else:
+            rows = blanks + rows[:count]
+
+        self._set_range(start, rows)
+
+    def erase(self, start, end):
+        """
+        Replace the rows in the range [start, end) by blank rows. (When a
+        shared `blank_row` was given, this is one slice assignment, without
+        creating any rows.)
+        """
+        if start < end:
+            self._extend_to(end - 1)
+
+            # (Extending can evict the top of the range.)
+            start = max(start, self.first_line)
+
+            if start < end:
+                self.decompress_from(start)
+                self._set_range(start, [self._get_blank_row() for _ in range(end - start)])
+
+    def __getitem__(self, line):
+        i = self._physical_index(line)
+
+        if i is None:
+            if line < self.first_line:
+                # Evicted from the history. Return a detached blank row.
+                return self._get_blank_row()
+
+            if line < self._hot_first:
+                return self._get_compressed_row(line)
+
+            self._extend_to(line)
+            i = self._physical_index(line)
+
+        return self._rows[i]
+
+    def _get_compressed_row(self, line):
+        " Read a row from the cold tier. "
+        # All blocks have the same size, so we can compute the index.
+        block = self._cold[(line - self._cold[0].first_line) // self.block_size]
+        cached_block, rows = self._decompressed
+
+        if block is not cached_block:
+            rows = block.decompress()
+            self._decompressed = (block, rows)
+
+        return rows[line - block.first_line]
+
+    def __setitem__(self, line, row):
+        if line >= self.end:
+            self._extend_to(line)
+        elif self.first_line <= line < self._hot_first:
+            self.decompress_from(line)
+
+        i = self._physical_index(line)
+        if i is not None:
+            self._memory_usage += (self._row_memory_usage(row) -
+                                   self._row_memory_usage(self._rows[i]))
+            self._rows[i] = row
+
+    def __delitem__(self, line):
+        " Deleting a row replaces it by a blank row. "
+        if line in self:
+            self[line] = self._get_blank_row()
+
+    def __contains__(self, line):
+        return self.first_line <= line < self.end
+
+    def __iter__(self):
+        " Iterate over the line numbers. (Like the keys of a dictionary.) "
+        return iter(range(self.first_line, self.end))
+
+    def keys(self):
+        return range(self.first_line, self.end)
+
+    def __len__(self):
+        return self.end - self.first_line
+
+    def drop_before(self, line):
+        """
+        Remove all rows above this line number. (The cost is proportional to
+        the amount of rows that are kept, not to the size of the history.)
+        """
+        if line > self.first_line:
+            self._drop_cold_before(min(line, self._hot_first))
+
+            if line > self._hot_first:
+                self._linearize()
+                self._memory_usage -= self._rows_memory_usage(
+                    self._rows[:line - self._hot_first])
+                del self._rows[:line - self._hot_first]
+                self._hot_first = line
+
+            self.first_line = line
+
+    def extend_back(self, line):
+        """
+        Store the lines from this line number onwards, by adding blank rows
+        before `first_line`. When the buffer is full, the rows at the end are
+        removed to make room.
+        """
+        count = min(self.first_line - line, self._max_rows)
+
+        if count > 0:
+            # Prepending to the hot tier requires all rows to be hot.
+            self.decompress_from(self.first_line)
+            self._linearize()
+
+            # Remove the rows at the end, that don't fit anymore.
+            keep = max(0, self._max_rows - count)
+            if keep < len(self._rows):
+                self._memory_usage -= self._rows_memory_usage(self._rows[keep:])
+                del self._rows[keep:]
+
+            self.first_line = self._hot_first = line + count
+            blank_rows = [self._get_blank_row() for _ in range(count)]
+            self._memory_usage += self._rows_memory_usage(blank_rows)
+
+            self._rows[0:0] = blank_rows
+            self.first_line -= count
+            self._hot_first = self.first_line
+
+    def get_style_ids(self):
+        " The set of style IDs that are used by the rows in this buffer. "
+        result = set()
+
+        for row in self._rows:
+            result.update(row.get_style_ids())
+
+        for block in self._cold:
+            result.update(block.style_ids)
+
+        return result
+
+    def memory_usage(self):
+        " Approximate amount of bytes used by the rows in this buffer. "
+        return (self._memory_usage +
+                sys.getsizeof(self._rows) + sys.getsizeof(self._cold))
+
+    def _clear_cold(self):
+        " Remove all compressed blocks. "
+        for block in self._cold:
+            self._memory_usage -= block.memory_usage()
+            block.release()
+
+        self._cold = []
+        self._decompressed = (None, None)
+
+    def compress_before(self, line, file_backed=False):
+        """
+        Move the rows above this line number to the cold tier, in blocks of
+        `block_size` rows.
+
+        :param file_backed: When True, store the new blocks in a file instead
+            of in memory.
+        """
+        block_size = self.block_size
+
+        if line - self._hot_first >= block_size:
+            if file_backed:
+                if self._file_store is None:
+                    self._file_store = _FileBlockStore()
+                store = self._file_store
+            else:
+                store = _memory_block_store
+
+            self._linearize()
+
+            while line - self._hot_first >= block_size and len(self._rows) >= block_size:
+                rows = self._rows[:block_size]
+                block = _CompressedBlock(self._hot_first, rows, store)
+                self._cold.append(block)
+                self._memory_usage += block.memory_usage() - self._rows_memory_usage(rows)
+
+                del self._rows[:block_size]
+                self._hot_first += block_size
+
+    def decompress_from(self, line):
+        """
+        Move the compressed blocks that contain this line, or the lines after
+        it, back to the hot tier. (When a row of the history is replaced, for
+        instance because it became visible again after a resize.)
+        """
+        cold = self._cold
+
+        if cold and cold[-1].end > line:
+            self._linearize()
+
+            while cold and cold[-1].end > line:
+                block = cold.pop()
+                skip = max(0, self.first_line - block.first_line)
+
+                rows = block.decompress()[skip:]
+                self._memory_usage += self._rows_memory_usage(rows) - block.memory_usage()
+
+                self._rows[0:0] = rows
+                block.release()
+                self._hot_first = block.first_line + skip
+
+            self._decompressed = (None, None)
+
+    def clear(self):
+        " Remove all rows and start counting again from zero. "
+        self._clear_cold()
+        self._rows = []
+        self._start = 0
+        self._hot_first = 0
+        self.first_line = 0
+        self._memory_usage = 0
@@ -0,0 +1,353 @@
+"""
+Spawn helper process.
+
+Forking the pymux server becomes slower when the server uses more memory.
+(Mostly because of the scrollback buffers.) So, at start-up, before any panes
+are created, we fork a small helper process that starts the processes for the
+panes.
+
+The server opens the pseudo terminal and sends the slave side, together with
+the command, working directory and environment to the helper. The helper
+forks and executes the command, and replies with the PID. When one of these
+processes terminates, the helper sends the exit status to the server.
+"""
+from __future__ import unicode_literals
+
+from .log import logger
+from .utils import pty_make_controlling_tty, get_open_file_descriptors
+
+import array
+import errno
+import fcntl
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import traceback
+
+__all__ = (
+    'Spawner',
+    'SpawnError',
+)
+
+_HEADER = struct.Struct(str('!I'))  # Length of a message.
+_EXIT_STATUS = struct.Struct(str('!ii'))  # PID and exit status.
+
+
+class SpawnError(Exception):
+    " Raised when the helper process can't start a process. "
+
+
+class Spawner(object):
+    """
+    Start processes through a helper process.
+
+    Usage::
+
+        spawner = Spawner()
+        spawner.start()
+        spawner.connect(eventloop)
+        pid = spawner.spawn(slave_fd, ['bash'], '/home', os.environ)
+        spawner.watch(pid, callback)
+    """
+    def __init__(self):
+        #: PID of the helper process.
+        self.pid = None
+
+        self._request_socket = None
+        self._exit_status_socket = None
+        self._exit_status_data = b''
+        self._callbacks = {}  # Maps the PID to the callback of `watch`.
+        self._eventloop = None
+
+    @property
+    def running(self):
+        " True when the helper process is available. "
+        return self._request_socket is not None
+
+    def start(self):
+        """
+        Fork the helper process. (This does nothing when passing file
+        descriptors over a Unix socket is not supported, like on Python 2.)
+        """
+        if self.running or not hasattr(socket.socket, 'sendmsg'):
+            return
+
+        request_socket, helper_request_socket = socket.socketpair()
+        exit_status_socket, helper_exit_status_socket = socket.socketpair()
+
+        pid = os.fork()
+
+        if pid == 0:
+            request_socket.close()
+            exit_status_socket.close()
+            try:
+                _Helper(helper_request_socket, helper_exit_status_socket).run()
+            finally:
+                os._exit(0)
+        else:
+            helper_request_socket.close()
+            helper_exit_status_socket.close()
+
+            self.pid = pid
+            self._request_socket = request_socket
+            self._exit_status_socket = exit_status_socket
+
+    def connect(self, eventloop):
+        """
+        Receive the exit status of the processes in this event loop.
+        """
+        if self.running:
+            self._eventloop = eventloop
+            eventloop.add_reader(self._exit_status_socket.fileno(),
+                                 self._receive_exit_status)
+
+    def spawn(self, slave_fd, command, cwd, env):
+        """
+        Execute this command in the helper process. Return the PID.
+
+        :param slave_fd: Slave side of the pseudo terminal for the process.
+        :param command: List of strings. (The arguments.)
+        :param cwd: Working directory of the new process.
+        :param env: Dictionary containing the environment.
+        """
+        assert self.running
+
+        # (Strings with lone surrogates, from undecodable environment
+        # variables, are escaped by `json.dumps` and restored by the helper.)
+        try:
+            request = json.dumps({
+                'command': command,
+                'cwd': cwd,
+                'env': dict(env),
+            }).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            raise SpawnError('Invalid spawn request: %r' % e)
+
+        try:
+            _send_message(self._request_socket, request, fds=[slave_fd])
+            response = _receive_message(self._request_socket)[0]
+        except (socket.error, EOFError) as e:
+            self._request_socket = None  # Don't try again.
+            raise SpawnError('Spawn helper not available: %r' % e)
+
+        response = json.loads(response.decode('utf-8'))
+
+        if 'error' in response:
+            raise SpawnError(response['error'])
+        return response['pid']
+
+    def watch(self, pid, callback):
+        """
+        Call `callback(status)` when the process with this PID terminates.
+        (`status` is `None` when the helper terminated before the process, in
+        which case we can't know the exit status anymore.)
+        """
+        assert callable(callback)
+        self._callbacks[pid] = callback
+
+    def _receive_exit_status(self):
+        " Called by the event loop, when the helper sends exit statuses. "
+        data = self._exit_status_socket.recv(4096)
+
+        if not data:
+            self._helper_terminated()
+            return
+
+        self._exit_status_data += data
+        size = _EXIT_STATUS.size
+
+        while len(self._exit_status_data) >= size:
+            pid, status = _EXIT_STATUS.unpack(self._exit_status_data[:size])
+            self._exit_status_data = self._exit_status_data[size:]
+
+            callback = self._callbacks.pop(pid, None)
+            if callback:
+                callback(status)
+
+    def _helper_terminated(self):
+        """
+        The helper process terminated. The processes that it started are no
+        children of us, so we can't wait for them. Report them as terminated.
+        (Closing their pseudo terminal will hang them up.)
+        """
+        logger.warning('Spawn helper terminated.')
+
+        self._eventloop.remove_reader(self._exit_status_socket.fileno())
+        self._exit_status_socket.close()
+        self._exit_status_socket = None
+        self._request_socket = None
+
+        callbacks = list(self._callbacks.values())
+        self._callbacks = {}
+
+        for callback in callbacks:
+            callback(None)
+
+
+class _Helper(object):
+    """
+    The part that runs in the helper process.
+    """
+    def __init__(self, request_socket, exit_status_socket):
+        self.request_socket = request_socket
+        self.exit_status_socket = exit_status_socket
+
+    def run(self):
+        # Don't keep the file descriptors of the server open.
+        keep = [self.request_socket.fileno(), self.exit_status_socket.fileno()]
+
+        for fd in get_open_file_descriptors() or []:
+            if fd > 2 and fd not in keep:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+        # Ignore keyboard interrupts for the server. (This handler is reset
+        # when the processes call `exec`.)
+        signal.signal(signal.SIGINT, lambda *a: None)
+
+        # Wake up `select` when a child terminates.
+        wakeup_r, wakeup_w = os.pipe()
+        for fd in (wakeup_r, wakeup_w):
+            _set_nonblocking(fd)
+
+        signal.signal(signal.SIGCHLD, lambda *a: None)
+        signal.set_wakeup_fd(wakeup_w)
+
+        while True:
+            try:
+                r, _, _ = select.select([self.request_socket, wakeup_r], [], [])
+            except (OSError, select.error) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            if wakeup_r in r:
+                os.read(wakeup_r, 1024)
+                self._reap_children()
+
+            if self.request_socket in r:
+                try:
+                    request, fds = _receive_message(self.request_socket)
+                except EOFError:
+                    return  # The server terminated.
+
+                self._handle_request(request, fds)
+
+    def _handle_request(self, request, fds):
+        request = json.loads(request.decode('utf-8'))
+
+        try:
+            pid = self._spawn(fds[0], request['command'], request['cwd'],
+                              request['env'])
+        except Exception as e:
+            response = {'error': repr(e)}
+        else:
+            response = {'pid': pid}
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+        _send_message(self.request_socket, json.dumps(response).encode('utf-8'))
+
+    def _spawn(self, slave_fd, command, cwd, env):
+        pid = os.fork()
+
+        if pid == 0:
+            try:
+                signal.set_wakeup_fd(-1)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+                pty_make_controlling_tty(slave_fd)
+
+                os.dup2(slave_fd, 0)
+                os.dup2(slave_fd, 1)
+                os.dup2(slave_fd, 2)
+
+                for fd in get_open_file_descriptors() or []:
+                    if fd > 2:
+                        try:
+                            os.close(fd)
+                        except OSError:
+                            pass
+
+                try:
+                    os.chdir(cwd)
+                except OSError:
+                    pass  # No such file or directory.
+
+                for p in env.get('PATH', os.defpath).split(':'):
+                    path = os.path.join(p, command[0])
+                    if os.path.exists(path) and os.access(path, os.X_OK):
+                        os.execve(path, command, env)
+            except Exception:
+                traceback.print_exc()
+            os._exit(1)
+
+        return pid
+
+    def _reap_children(self):
+        " Report the exit status of the terminated children to the server. "
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError:
+                return  # No children.
+
+            if pid == 0:
+                return
+
+            self.exit_status_socket.sendall(_EXIT_STATUS.pack(pid, status))
+
+
+def _send_message(sock, data, fds=()):
+    " Send a message and optionally file descriptors over a Unix socket. "
+    data = _HEADER.pack(len(data)) + data
+    ancillary = []
+
+    if fds:
+        ancillary.append((socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                          array.array(str('i'), fds)))
+
+    sent = sock.sendmsg([data], ancillary)
+    sock.sendall(data[sent:])
+
+
+def _receive_message(sock):
+    """
+    Receive a message that was sent with `_send_message`. Return a
+    (data, fds) tuple. Raise `EOFError` when the socket was closed.
+    """
+    fds = array.array(str('i'))
+    header, ancillary, _, _ = sock.recvmsg(
+        _HEADER.size, socket.CMSG_LEN(16 * fds.itemsize))
+
+    for level, type, data in ancillary:
+        if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+
+    header += _receive_exactly(sock, _HEADER.size - len(header))
+    data = _receive_exactly(sock, _HEADER.unpack(header)[0])
+    return data, list(fds)
+
+
+def _receive_exactly(sock, size):
+    result = []
+
+    while size > 0:
+        data = sock.recv(size)
+        if not data:
+            raise EOFError
+        result.append(data)
+        size -= len(data)
+
+    return b''.join(result)
+
+
+def _set_nonblocking(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
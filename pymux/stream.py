@@ -4,6 +4,10 @@ Improvements on Pyte.
 from __future__ import unicode_literals
 from pyte.streams import Stream
 from pyte.escape import NEL
+from pyte import control as ctrl
+
+import re
+import six
 
 __all__ = (
     'BetterStream',
@@ -29,13 +33,116 @@ class BetterStream(Stream):
         NEL: "next_line",
     })
 
+    # Characters that are drawn when the stream is in the 'stream' state:
+    # everything, except the basic control characters, the escape characters
+    # and the characters that are ignored.
+    _text_run_re = re.compile('[^%s]+' % re.escape(''.join(
+        list(Stream.basic) + [ctrl.ESC, ctrl.CSI, ctrl.NUL, ctrl.DEL])))
+
+    # Complete "CSI <params> <final>" and "Esc]<data>BEL" sequences. These can
+    # be dispatched at once, without going through the state machine.
+    _sequence_re = re.compile(
+        '(?:\x1b\\[|\x9b)([?>]*)([0-9;]*)([%s])|\x1b\\]([^\x07]*)\x07' %
+        re.escape(''.join(csi)))
+
+    #: Maximum amount of parsed CSI sequences to keep in `_csi_cache`.
+    _csi_cache_size = 1024
+
     def __init__(self, screen):
         super(BetterStream, self).__init__()
 
         self.handlers['square_close'] = self._square_close
         self.handlers['escape'] = self._escape
         self._square_close_data = []
+        self._csi_cache = {}
+        self.attach(screen)
+
+    def attach(self, screen, only=()):
+        """
+        Attach the screen to this stream. (Only one screen is supported.)
+
+        The handlers for all the events are looked up once here, instead of
+        doing a `getattr` for every event that we dispatch.
+        """
         self.listener = screen
+        self.listeners = [(screen, set(only))]
+
+        events = set(['draw', 'draw_text', 'square_close', 'debug'])
+        for table in (self.basic, self.escape, self.sharp, self.csi):
+            events.update(table.values())
+
+        self._event_handlers = dict(
+            (event, getattr(screen, event)) for event in events
+            if hasattr(screen, event))
+
+    def feed(self, chars):
+        """
+        Consume a string of characters.
+
+        Runs of printable text are passed to the `draw_text` method of the
+        listener at once, instead of going through the state machine one
+        character at a time. The same is true for complete CSI and
+        ``Esc]<num>...BEL`` sequences. Everything else (like sequences that
+        are split over several `feed` calls) is consumed as usual.
+
+        The listener's `__after__` method is called once, when all characters
+        have been consumed.
+        """
+        if not isinstance(chars, six.text_type):
+            raise TypeError('%s requires text input' % self.__class__.__name__)
+
+        match_text_run = self._text_run_re.match
+        match_sequence = self._sequence_re.match
+        consume = self.consume
+        i = 0
+        length = len(chars)
+
+        try:
+            while i < length:
+                if self.state == 'stream':
+                    match = match_text_run(chars, i)
+                    if match:
+                        self.dispatch('draw_text', match.group())
+                        i = match.end()
+                        continue
+
+                    match = match_sequence(chars, i)
+                    if match:
+                        self._dispatch_sequence(match)
+                        i = match.end()
+                        continue
+
+                consume(chars[i])
+                i += 1
+        finally:
+            # __after__ is used to set the correct screen height.
+            self.listener.__after__(self)
+
+    def _dispatch_sequence(self, match):
+        " Dispatch a sequence that was matched by `_sequence_re`. "
+        osc_data = match.group(4)
+
+        if osc_data is not None:
+            self.dispatch('square_close', osc_data)
+            return
+
+        sequence = match.group()
+        try:
+            event, params, private = self._csi_cache[sequence]
+        except KeyError:
+            prefix, params, final = match.group(1, 2, 3)
+
+            event = self.csi[final]
+            params = tuple(min(int(p or 0), 9999) for p in params.split(';'))
+            private = '?' in prefix
+
+            if len(self._csi_cache) >= self._csi_cache_size:
+                self._csi_cache.clear()
+            self._csi_cache[sequence] = event, params, private
+
+        if private:
+            self.flags['private'] = True
+        self.dispatch(event, *params)
 
     def _escape(self, char):
         if char == ']':
@@ -64,14 +171,14 @@ class BetterStream(Stream):
         A few additions to improve performance.
 
         The code from Pyte has a few 'hasattr' calls in here, which is
-        inefficient.
+        inefficient. We use the handlers that were looked up in `attach`.
         """
         try:
-            handler = getattr(self.listener, event)
+            try:
+                handler = self._event_handlers[event]
+            except KeyError:
+                handler = getattr(self.listener, event)
             handler(*args, **self.flags)
         finally:
-            # __after__ is used to set the correct screen height.
-            self.listener.__after__(self)
-
             if kwargs.get('reset', True):
                 self.reset()
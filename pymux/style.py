@@ -5,10 +5,20 @@ from __future__ import unicode_literals
 from prompt_toolkit.styles import PygmentsStyle, Style, Attrs
 from pygments.token import Token
 
+import weakref
+
 __all__ = (
+    'DEFAULT_ATTRS',
+    'DEFAULT_TOKEN',
     'PymuxStyle',
+    'StyleTable',
+    'style_table',
 )
 
+DEFAULT_ATTRS = Attrs(color=None, bgcolor=None, bold=False, underline=False,
+                      italic=False, blink=False, reverse=False)
+DEFAULT_TOKEN = ('C', ) + DEFAULT_ATTRS
+
 
 ui_style = {
     Token.Line:                         '#888888',
@@ -66,6 +76,121 @@ ui_style = {
 }
 
 
+class StyleTable(object):
+    """
+    Interning table for the styles of the characters in the panes.
+
+    The cells of a pane store a small integer (the style ID), that refers to
+    a token in this table. Style ID 0 is always `DEFAULT_TOKEN`. For every
+    token, the table also keeps the `Attrs`, so that the renderer doesn't
+    have to unpack the token for every cell.
+
+    When the table grows beyond `min_collect_size` entries (and each time it
+    doubled after that), the style IDs that are no longer used are freed, so
+    that they can be reused. The screens that store style IDs have to be
+    registered through :meth:`register`, the caches that contain style IDs
+    through :meth:`register_cache`.
+
+    :param min_collect_size: Don't collect unused style IDs while the table
+        is smaller than this.
+    """
+    def __init__(self, min_collect_size=4096):
+        self.min_collect_size = min_collect_size
+
+        self._tokens = []
+        self._attrs = []
+        self._style_ids = {}
+        self._free_style_ids = []
+
+        self._users = weakref.WeakSet()
+        self._caches = []
+        self._collect_size = min_collect_size
+
+        self.get_style_id(DEFAULT_TOKEN)
+
+    def register(self, user):
+        """
+        Register an object that stores style IDs. It needs a `get_style_ids`
+        method that returns the style IDs that are in use. (Only a weak
+        reference is kept.)
+        """
+        self._users.add(user)
+
+    def register_cache(self, cache):
+        " Register a cache that contains style IDs. It's cleared when collecting. "
+        self._caches.append(cache)
+
+    def get_style_id(self, token):
+        " Return the style ID for this token. (Add it to the table if needed.) "
+        try:
+            return self._style_ids[token]
+        except KeyError:
+            if len(self._style_ids) >= self._collect_size:
+                self.collect()
+
+            attrs = Attrs(*token[1:]) if token[0] == 'C' else None
+
+            if self._free_style_ids:
+                style_id = self._free_style_ids.pop()
+                self._tokens[style_id] = token
+                self._attrs[style_id] = attrs
+            else:
+                style_id = len(self._tokens)
+                self._tokens.append(token)
+                self._attrs.append(attrs)
+
+            self._style_ids[token] = style_id
+            return style_id
+
+    def collect(self):
+        " Free the style IDs that are not used by any of the registered users. "
+        live = set([0])
+
+        for user in list(self._users):
+            live.update(user.get_style_ids())
+
+        for style_id, token in enumerate(self._tokens):
+            if token is not None and style_id not in live:
+                del self._style_ids[token]
+                self._tokens[style_id] = None
+                self._attrs[style_id] = None
+                self._free_style_ids.append(style_id)
+
+        for cache in self._caches:
+            cache.clear()
+
+        self._collect_size = max(self.min_collect_size, 2 * len(self._style_ids))
+
+    def get_style_id_for_attrs(self, attrs):
+        " Return the style ID for this `Attrs` instance. "
+        return self.get_style_id(('C', ) + attrs)
+
+    def get_token(self, style_id):
+        " Return the token for this style ID. "
+        return self._tokens[style_id]
+
+    def get_attrs(self, style_id):
+        " Return the `Attrs` for this style ID. "
+        return self._attrs[style_id]
+
+    def get_attrs_for_token(self, token):
+        """
+        Return the `Attrs` for a ('C', ...) token. (This is called while
+        rendering, so unknown tokens are not added to the table.)
+        """
+        try:
+            return self._attrs[self._style_ids[token]]
+        except KeyError:
+            return Attrs(*token[1:])
+
+    def __len__(self):
+        return len(self._style_ids)
+
+
+#: The style table, shared by all the panes of this session.
+style_table = StyleTable()
+
+
 class PymuxStyle(Style):
     """
     The styling. It includes the pygments style from above. But further, in
@@ -79,8 +204,8 @@ class PymuxStyle(Style):
     def get_attrs_for_token(self, token):
         if token and token[0] == 'C':
             # Token starts with ('C',). Token describes its own style.
-            c, fg, bg, bold, underline, italic, blink, reverse = token
-            return Attrs(fg, bg, bold, underline, italic, blink, reverse)
+            # (The style table keeps the `Attrs` for every interned token.)
+            return style_table.get_attrs_for_token(token)
         else:
             # Take styles from Pygments style.
             return self.pygments_style.get_attrs_for_token(token)
@@ -3,6 +3,7 @@ Some utilities.
 """
 from __future__ import unicode_literals
 import array
+import collections
 import fcntl
 import getpass
 import os
@@ -14,8 +15,11 @@ __all__ = (
     'pty_make_controlling_tty',
     'daemonize',
     'set_terminal_size',
+    'set_cloexec',
+    'get_open_file_descriptors',
     'nonblocking',
     'get_default_shell',
+    'LRUCache',
 )
 
 
@@ -127,6 +131,27 @@ def daemonize(stdin='/dev/null', stdout='/dev/null', stderr='/dev/null'):
     return 1
 
 
+def set_cloexec(fd):
+    """
+    Set the close-on-exec flag for this file descriptor.
+    """
+    flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+    fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+
+def get_open_file_descriptors():
+    """
+    Return a list of the open file descriptors of this process. (Or `None`
+    when unknown.)
+    """
+    # On Linux and OS X, the open file descriptors are listed in a directory.
+    for path in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return sorted(int(fd) for fd in os.listdir(path))
+        except (OSError, ValueError):
+            pass
+
+
 def set_terminal_size(stdout_fileno, rows, cols):
     """
     Set terminal size.
@@ -168,3 +193,53 @@ def get_default_shell():
     username = getpass.getuser()
     shell = pwd.getpwnam(username).pw_shell
     return shell
+
+
+class LRUCache(object):
+    """
+    Mapping with a maximum size, that discards the least recently used items
+    first. Keeps track of the amount of hits and misses.
+
+    Usage::
+
+        value = cache.get(key)
+        if value is None:
+            value = cache[key] = compute(key)
+
+    :param maxsize: Maximum amount of items.
+    """
+    def __init__(self, maxsize=1024):
+        assert isinstance(maxsize, int) and maxsize > 0
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key):
+        " Return the value for this key, or `None` when it's not cached. "
+        data = self._data
+
+        try:
+            # Move to the end. (Most recently used.)
+            value = data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        else:
+            data[key] = value
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        data = self._data
+        data[key] = value
+
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
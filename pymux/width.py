@@ -0,0 +1,56 @@
+"""
+Fast lookup of the width of characters.
+
+The widths of the Basic Multilingual Plane are stored in an array with one
+byte per code point, the other planes are looked up in a sorted range table.
+Both are built from the generated :mod:`pymux.width_table`.
+"""
+from __future__ import unicode_literals
+from array import array
+from bisect import bisect_right
+
+from .width_table import ZERO_WIDTH_RANGES, WIDE_RANGES
+
+__all__ = (
+    'get_char_width',
+)
+
+_BMP_SIZE = 0x10000
+
+
+def _create_tables():
+    bmp = array(str('b'), [1]) * _BMP_SIZE
+    astral = []
+
+    for width, ranges in ((0, ZERO_WIDTH_RANGES), (2, WIDE_RANGES)):
+        for start, end in ranges:
+            for code_point in range(start, min(end + 1, _BMP_SIZE)):
+                bmp[code_point] = width
+
+            if end >= _BMP_SIZE:
+                astral.append((max(start, _BMP_SIZE), end, width))
+
+    astral.sort()
+    return bmp, tuple(a[0] for a in astral), tuple(astral)
+
+
+_BMP_WIDTHS, _ASTRAL_STARTS, _ASTRAL_RANGES = _create_tables()
+
+
+def get_char_width(char):
+    """
+    Return the amount of cells that this character takes: 0, 1 or 2.
+    (Control characters have a width of zero.)
+    """
+    code_point = ord(char)
+
+    if code_point < _BMP_SIZE:
+        return _BMP_WIDTHS[code_point]
+
+    i = bisect_right(_ASTRAL_STARTS, code_point) - 1
+    if i >= 0:
+        start, end, width = _ASTRAL_RANGES[i]
+        if code_point <= end:
+            return width
+
+    return 1
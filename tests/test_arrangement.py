@@ -0,0 +1,55 @@
+from __future__ import unicode_literals
+
+from prompt_toolkit.eventloop.posix import PosixEventLoop
+
+from pymux.arrangement import Pane
+from pymux.process import Process
+
+import os
+import pytest
+
+
+@pytest.fixture
+def pane():
+    process = Process(PosixEventLoop(), lambda: None, lambda: None)
+    process.screen.resize(10, 80)
+
+    yield Pane(process)
+
+    os.close(process.master)
+    os.close(process.slave)
+
+
+def _feed_lines(pane, count):
+    pane.process.stream.feed(''.join('line %i\r\n' % i for i in range(count)))
+
+
+def test_new_line_count(pane):
+    _feed_lines(pane, 30)
+    pane.display_text('help')
+
+    _feed_lines(pane, 5)
+    assert pane.new_line_count == 5
+
+
+def test_new_line_count_after_clear(pane):
+    _feed_lines(pane, 30)
+    pane.display_text('help')
+
+    # Clearing the screen and moving the cursor don't count as new lines.
+    pane.process.stream.feed('\x1b[H\x1b[2J\x1b[3J\x1b[5;1Hx')
+    assert pane.new_line_count == 0
+
+    _feed_lines(pane, 20)
+    assert pane.new_line_count == 15
+
+
+def test_new_line_count_alternate_screen(pane):
+    _feed_lines(pane, 30)
+    pane.display_text('help')
+
+    pane.process.stream.feed('\x1b[?1049h')
+    _feed_lines(pane, 15)
+    pane.process.stream.feed('\x1b[?1049l')
+
+    assert pane.new_line_count == 6
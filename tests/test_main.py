@@ -0,0 +1,33 @@
+from __future__ import unicode_literals
+
+from prompt_toolkit.eventloop.posix import PosixEventLoop
+
+from pymux.arrangement import Pane, Window
+from pymux.main import Pymux
+from pymux.process import Process
+
+import os
+import pytest
+import sys
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='Requires /proc.')
+def test_new_pane_in_current_directory(tmpdir, monkeypatch):
+    pymux = Pymux()
+    paths = []
+    monkeypatch.setattr(pymux, 'start_pane', lambda command, path: paths.append(path))
+
+    # A process of which the cached directory is not known yet.
+    process = Process(PosixEventLoop(), lambda: None, lambda: None,
+                      metadata_refresher=pymux.metadata_refresher)
+    process.pid = os.getpid()
+    window = Window()
+    window.add_pane(Pane(process))
+
+    monkeypatch.chdir(str(tmpdir))
+    pymux._create_pane(window, command='true')
+
+    assert paths == [os.path.realpath(str(tmpdir))]
+
+    os.close(process.master)
+    os.close(process.slave)
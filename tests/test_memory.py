@@ -0,0 +1,39 @@
+from __future__ import unicode_literals
+
+from pymux.memory import HistoryMemoryAccountant
+from pymux.screen import BetterScreen
+from pymux.stream import BetterStream
+
+
+class _Pane(object):
+    def __init__(self, last_viewed, lines):
+        self.last_viewed = last_viewed
+        self.process = self  # (`pane.process.screen`.)
+        self.screen = BetterScreen(10, 80, lambda data: None,
+                                   get_history_limit=lambda: 100000)
+
+        stream = BetterStream(self.screen)
+        stream.attach(self.screen)
+        stream.feed(''.join('line %i\r\n' % i for i in range(lines)))
+
+
+class _Pymux(object):
+    def __init__(self, panes, history_memory_limit):
+        self.history_memory_limit = history_memory_limit
+        self.arrangement = self
+        self.windows = [self]  # (`arrangement.windows[0].panes`.)
+        self.panes = panes
+
+
+def test_enforce():
+    old = _Pane(last_viewed=1, lines=3000)
+    new = _Pane(last_viewed=2, lines=3000)
+    total = old.screen.memory_usage() + new.screen.memory_usage()
+
+    limit = total - old.screen.memory_usage() // 2
+    HistoryMemoryAccountant(_Pymux([old, new], limit)).enforce()
+
+    # Only the history of the least recently viewed pane was trimmed.
+    assert old.screen.memory_usage() + new.screen.memory_usage() <= limit
+    assert 0 < old.screen.history_size < 3000
+    assert new.screen.history_size == 2991
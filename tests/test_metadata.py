@@ -0,0 +1,65 @@
+from __future__ import unicode_literals
+
+from prompt_toolkit.eventloop.posix import PosixEventLoop
+
+from pymux.metadata import MetadataRefresher
+from pymux.process import Process
+
+import os
+import time
+
+
+class _Process(object):
+    " Process that counts the metadata updates. "
+    is_terminated = False
+
+    def __init__(self):
+        self.updates = 0
+
+    def update_metadata(self):
+        self.updates += 1
+        return False
+
+
+def test_requests_dont_postpone_full_refresh():
+    refresher = MetadataRefresher(None, lambda: None, interval=.1, min_interval=.01)
+    busy = _Process()
+    silent = _Process()
+
+    refresher.add(busy)
+    refresher.add(silent)
+    refresher.start()
+
+    # One of the processes keeps requesting a refresh.
+    end_time = time.time() + 1
+    while time.time() < end_time:
+        refresher.request(busy)
+        time.sleep(.005)
+
+    assert busy.updates > 20
+    assert silent.updates >= 5
+
+
+class _Refresher(object):
+    " Refresher that counts the requests. "
+    min_interval = .2
+
+    def __init__(self):
+        self.requests = 0
+
+    def request(self, process):
+        self.requests += 1
+
+
+def test_throttle_requests():
+    refresher = _Refresher()
+    process = Process(PosixEventLoop(), lambda: None, lambda: None,
+                      metadata_refresher=refresher)
+
+    for i in range(100):
+        process.request_metadata_update()
+
+    assert refresher.requests == 1
+
+    os.close(process.master)
+    os.close(process.slave)
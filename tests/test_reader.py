@@ -0,0 +1,39 @@
+from __future__ import unicode_literals
+
+from pymux.reader import PtyReader
+
+import os
+
+
+def _read_all(reader):
+    result = []
+
+    while not reader.closed:
+        result.append(reader.read())
+
+    return ''.join(result)
+
+
+def _create_reader(data, **kwargs):
+    r, w = os.pipe()
+    os.write(w, data)
+    os.close(w)
+    return PtyReader(r, **kwargs)
+
+
+def test_invalid_utf8():
+    # An invalid byte is replaced. It doesn't discard the rest of the output.
+    reader = _create_reader(b'A' * 3000 + b'\xff' + b'B' * 1000)
+    assert _read_all(reader) == 'A' * 3000 + '\ufffd' + 'B' * 1000
+
+
+def test_latin1():
+    reader = _create_reader(b'caf\xe9\r\n')
+    assert _read_all(reader) == 'caf\ufffd\r\n'
+
+
+def test_split_utf8_sequence():
+    # A multi-byte sequence that is split over two reads.
+    reader = _create_reader('\u20ac\u20ac'.encode('utf-8'))
+    assert reader.read(4) == '\u20ac'
+    assert _read_all(reader) == '\u20ac'
@@ -0,0 +1,67 @@
+from __future__ import unicode_literals
+
+from pymux.reaper import ChildReaper, exit_status_to_code
+
+import errno
+import os
+import pytest
+import signal
+import time
+
+
+class _EventLoop(object):
+    def add_reader(self, fd, callback):
+        pass
+
+
+@pytest.fixture
+def reaper():
+    reaper = ChildReaper(_EventLoop())
+    reaper.start()
+
+    yield reaper
+
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    os.close(reaper._read_fd)
+    os.close(reaper._write_fd)
+
+
+def _fork(exit_code):
+    pid = os.fork()
+    if pid == 0:
+        os._exit(exit_code)
+    return pid
+
+
+def _reap_until(reaper, condition):
+    end_time = time.time() + 5
+    while not condition() and time.time() < end_time:
+        time.sleep(.01)
+        reaper._reap()
+
+
+def _is_reaped(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.ESRCH
+    return False
+
+
+def test_watch(reaper):
+    result = []
+    pid = _fork(3)
+    reaper.watch(pid, result.append)
+
+    _reap_until(reaper, lambda: result)
+    assert [exit_status_to_code(s) for s in result] == [3]
+
+
+def test_unwatched_status_is_not_kept(reaper):
+    # The PID can be reused, so a later `watch` doesn't receive this status.
+    pid = _fork(3)
+    _reap_until(reaper, lambda: _is_reaped(pid))
+
+    result = []
+    reaper.watch(pid, result.append)
+    assert result == []
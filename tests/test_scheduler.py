@@ -0,0 +1,61 @@
+from __future__ import unicode_literals
+
+from pymux.scheduler import FrameScheduler
+
+import threading
+import time
+
+
+class _EventLoop(object):
+    " Event loop that only collects the calls from the executor. "
+    def __init__(self):
+        self.calls = []
+
+    def call_from_executor(self, callback, _max_postpone_until=None):
+        self.calls.append(callback)
+
+    def run_pending(self, timeout=1):
+        " Wait for the next call from the executor and run it. "
+        end_time = time.time() + timeout
+        while not self.calls and time.time() < end_time:
+            time.sleep(.001)
+
+        self.calls.pop(0)()
+
+
+def test_postponed_frames():
+    eventloop = _EventLoop()
+    frames = []
+    scheduler = FrameScheduler(eventloop, frames.append, lambda: 50)
+    thread_count = threading.active_count()
+
+    for i in range(20):
+        scheduler.invalidate(['a'])
+        scheduler.invalidate(['b'])
+        eventloop.run_pending()
+
+    # The first frame is rendered immediately, the others are postponed.
+    # After that, every frame contains both invalidations.
+    assert frames[:2] == [set(['a']), set(['b'])]
+    assert frames[2:] == [set(['a', 'b'])] * 19
+    assert not eventloop.calls
+
+    # All frames are started by the same timer thread.
+    assert threading.active_count() == thread_count + 1
+
+
+def test_invalidate_while_rendering():
+    eventloop = _EventLoop()
+    frames = []
+
+    def render(clients):
+        frames.append(clients)
+        if len(frames) == 1:
+            scheduler.invalidate(['b'])
+
+    scheduler = FrameScheduler(eventloop, render, lambda: 50)
+    scheduler.invalidate(['a'])
+
+    # The invalidation during the first frame is rendered in a second frame.
+    eventloop.run_pending()
+    assert frames == [set(['a']), set(['b'])]
@@ -0,0 +1,98 @@
+from __future__ import unicode_literals
+
+from pymux.screen import BetterScreen
+from pymux.stream import BetterStream
+
+
+def _create_screen(lines, columns, history_limit=2000):
+    screen = BetterScreen(lines, columns, lambda data: None,
+                          get_history_limit=lambda: history_limit)
+    stream = BetterStream(screen)
+    stream.attach(screen)
+    return screen, stream
+
+
+def _display(screen):
+    " The visible text, one string per line. "
+    return [screen.data_buffer[screen.line_offset + y].get_text().rstrip()
+            for y in range(screen.lines)]
+
+
+def test_grow_alternate_screen_without_history():
+    screen, stream = _create_screen(24, 80, history_limit=0)
+    stream.feed('\x1b[?1049h')
+
+    screen.resize(50, 80)
+    stream.feed('\x1b[2J\x1b[50;1Hbottom')
+
+    assert _display(screen)[49] == 'bottom'
+
+
+def test_grow_after_clear_history():
+    screen, stream = _create_screen(10, 80)
+    stream.feed(''.join('line %i\r\n' % i for i in range(30)))
+
+    screen.clear_history()
+    screen.resize(20, 80)
+    stream.feed('\x1b[H\x1b[2JTOP\x1b[5;1HFIVE')
+
+    display = _display(screen)
+    assert display[0] == 'TOP'
+    assert display[4] == 'FIVE'
+
+
+def test_grow_after_trim_history():
+    screen, stream = _create_screen(10, 80, history_limit=100)
+    stream.feed(''.join('line %i\r\n' % i for i in range(30)))
+
+    screen.trim_history(1000)
+    screen.resize(20, 80)
+    stream.feed('\x1b[Htop')
+
+    assert _display(screen)[0] == 'top'
+    assert screen.data_buffer.max_rows >= screen.lines
+
+
+def test_damage_without_consumer():
+    # Nobody consumes the damage, so nothing has to be tracked.
+    screen, stream = _create_screen(10, 80)
+    stream.feed(''.join('line %i\r\n' % i for i in range(1000)))
+    assert not screen._damaged_rows
+
+
+def test_damage_is_bounded_by_visible_rows():
+    screen, stream = _create_screen(10, 80)
+    screen.consume_damage()
+
+    stream.feed(''.join('line %i\r\n' % i for i in range(1000)))
+    damage = screen.consume_damage()
+
+    assert not damage.all
+    assert damage.rows == set(range(screen.line_offset, screen.line_offset + 9))
+
+
+def test_damage():
+    screen, stream = _create_screen(10, 80)
+    screen.consume_damage()
+
+    stream.feed('\x1b[3;1Hx')
+    assert screen.consume_damage().rows == set([2])
+
+    screen.resize(20, 80)
+    damage = screen.consume_damage()
+    assert damage.all and not damage.rows
+
+
+def test_resize_alternate_screen_with_full_history():
+    # The buffer is full, and the resize moves the top of the alternate
+    # screen above the first line that is stored.
+    screen, stream = _create_screen(24, 80, history_limit=300)
+    stream.feed('\x1b[?1049h')
+    stream.feed(''.join('line %i\r\n' % i for i in range(400)))
+
+    screen.resize(30, 80)
+    stream.feed('\x1b[1;1Htop\x1b[30;1Hbottom')
+
+    display = _display(screen)
+    assert display[0] == 'top'
+    assert display[29] == 'bottom'
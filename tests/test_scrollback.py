@@ -0,0 +1,155 @@
+from __future__ import unicode_literals
+
+from pymux.row import Row, BLANK_ROW
+from pymux.scrollback import ScrollbackBuffer
+
+from random import Random
+import sys
+
+
+def _create_buffer(max_rows, lines):
+    " Buffer with `lines` rows. Row `i` contains the character `chr(65 + i)`. "
+    buffer = ScrollbackBuffer(Row, max_rows=max_rows, blank_row=BLANK_ROW)
+
+    for i in range(lines):
+        row = Row()
+        row.set(0, 65 + i, 0)
+        buffer[i] = row
+
+    return buffer
+
+
+def _text(buffer, start, end):
+    return ''.join(buffer[i][0].char for i in range(start, end))
+
+
+def test_scroll_up():
+    buffer = _create_buffer(100, 5)
+    buffer.scroll(1, 4, 1)
+    assert _text(buffer, 0, 5) == 'ACD E'
+
+
+def test_scroll_down():
+    buffer = _create_buffer(100, 5)
+    buffer.scroll(1, 4, -2)
+    assert _text(buffer, 0, 5) == 'A  BE'
+
+
+def test_scroll_wrapped_ring():
+    # The ring buffer is full, so the range wraps around the underlying list.
+    buffer = _create_buffer(4, 6)
+    assert buffer.first_line == 2
+
+    buffer.scroll(2, 6, 1)
+    assert _text(buffer, 2, 6) == 'DEF '
+
+
+def test_erase():
+    buffer = _create_buffer(100, 5)
+    buffer.erase(1, 3)
+    assert _text(buffer, 0, 5) == 'A  DE'
+
+
+def test_range_larger_than_max_rows():
+    # Extending the buffer for the range evicts the top of the range.
+    buffer = _create_buffer(3, 3)
+    buffer.erase(0, 10)
+    assert buffer.first_line == 7
+    assert _text(buffer, 0, 10) == ' ' * 10
+
+    buffer = _create_buffer(3, 3)
+    buffer.scroll(0, 10, 1)
+    assert _text(buffer, 0, 10) == ' ' * 10
+
+    buffer = _create_buffer(3, 3)
+    buffer.scroll(0, 10, -1)
+    assert _text(buffer, 0, 10) == ' ' * 10
+
+
+def test_range_before_first_line():
+    buffer = _create_buffer(3, 5)
+    assert buffer.first_line == 2
+
+    buffer.scroll(0, 5, 1)
+    assert _text(buffer, 2, 5) == 'DE '
+
+    buffer.erase(0, 4)
+    assert _text(buffer, 2, 5) == '   '
+
+
+def test_extend_back():
+    buffer = _create_buffer(100, 5)
+    buffer.drop_before(3)
+
+    row = Row()
+    row.set(0, ord('x'), 0)
+    buffer[1] = row  # Not stored.
+    assert _text(buffer, 0, 5) == '   DE'
+
+    buffer.extend_back(1)
+    assert buffer.first_line == 1
+
+    buffer[1] = row
+    assert _text(buffer, 0, 5) == ' x DE'
+
+
+def test_extend_back_full():
+    # The rows at the end are removed to make room.
+    buffer = _create_buffer(4, 10)
+    assert buffer.first_line == 6
+
+    buffer.extend_back(4)
+    assert (buffer.first_line, buffer.end) == (4, 8)
+    assert _text(buffer, 4, 8) == '  GH'
+
+    buffer.extend_back(0)
+    assert (buffer.first_line, buffer.end) == (0, 4)
+    assert _text(buffer, 0, 4) == '    '
+
+
+def test_extend_back_compressed():
+    buffer = _create_buffer(100, 20)
+    buffer.block_size = 4
+    buffer.compress_before(16)
+    buffer.drop_before(6)
+
+    buffer.extend_back(2)
+    assert buffer.first_line == 2
+    assert _text(buffer, 0, 20) == '      GHIJKLMNOPQRST'
+
+
+def _count_memory_usage(buffer):
+    " Compute the memory usage of the buffer from scratch. "
+    return (sum(buffer._row_memory_usage(row) for row in buffer._rows) +
+            sum(block.memory_usage() for block in buffer._cold) +
+            sys.getsizeof(buffer._rows) + sys.getsizeof(buffer._cold))
+
+
+def test_memory_usage():
+    buffer = _create_buffer(50, 0)
+    buffer.block_size = 4
+    random = Random(0)
+
+    for i in range(2000):
+        line = buffer.end - random.randint(0, 10)
+        action = random.randint(0, 9)
+
+        if action < 4:
+            row = Row()
+            row.set(0, 65 + i % 26, 0)
+            buffer[line] = row.freeze() if action < 2 else row
+        elif action == 4:
+            buffer.scroll(line - 5, line + random.randint(0, 80), random.randint(-3, 3))
+        elif action == 5:
+            buffer.erase(line - 5, line + random.randint(0, 80))
+        elif action == 6:
+            buffer.compress_before(line, file_backed=random.random() < .5)
+        elif action == 7:
+            buffer.drop_before(line)
+            buffer.extend_back(line - random.randint(0, 10))
+        elif action == 8:
+            buffer.max_rows = random.randint(10, 60)
+        elif random.random() < .05:
+            buffer.clear()
+
+        assert buffer.memory_usage() == _count_memory_usage(buffer)
@@ -0,0 +1,94 @@
+from __future__ import unicode_literals
+
+from prompt_toolkit.eventloop.posix import PosixEventLoop
+
+from pymux.spawner import Spawner, SpawnError
+
+import os
+import pytest
+import select
+import signal
+import socket
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket.socket, 'sendmsg'), reason='Requires socket.sendmsg.')
+
+
+@pytest.fixture
+def spawner():
+    spawner = Spawner()
+    spawner.start()
+    spawner.connect(PosixEventLoop())
+
+    yield spawner
+
+    if spawner.running:
+        os.kill(spawner.pid, signal.SIGKILL)
+    os.waitpid(spawner.pid, 0)
+
+
+def _spawn(spawner, command, env=None):
+    master, slave = os.openpty()
+    pid = spawner.spawn(slave, command, '/', env or dict(os.environ))
+    os.close(slave)
+    return master, pid
+
+
+def _wait_for_exit_status(spawner, pid):
+    result = []
+    spawner.watch(pid, result.append)
+
+    while not result:
+        select.select([spawner._exit_status_socket], [], [], 5)
+        spawner._receive_exit_status()
+
+    return result[0]
+
+
+def test_exit_status(spawner):
+    master, pid = _spawn(spawner, ['sh', '-c', 'exit 3'])
+    status = _wait_for_exit_status(spawner, pid)
+
+    assert os.WEXITSTATUS(status) == 3
+    os.close(master)
+
+
+def test_environment_with_surrogates(spawner, tmpdir):
+    # Undecodable bytes in the environment are passed through unchanged.
+    path = str(tmpdir.join('out'))
+    env = dict(os.environ, VALUE=os.fsdecode(b'a\xff'))
+
+    master, pid = _spawn(spawner, ['sh', '-c', 'printf %s "$VALUE" > ' + path], env)
+    _wait_for_exit_status(spawner, pid)
+
+    with open(path, 'rb') as f:
+        assert f.read() == b'a\xff'
+    os.close(master)
+
+
+def test_invalid_request(spawner):
+    master, slave = os.openpty()
+
+    with pytest.raises(SpawnError):
+        spawner.spawn(slave, ['true'], '/', {'VALUE': object()})
+
+    os.close(master)
+    os.close(slave)
+
+
+def test_helper_terminated(spawner):
+    master, pid = _spawn(spawner, ['sleep', '30'])
+
+    result = []
+    spawner.watch(pid, result.append)
+
+    os.kill(spawner.pid, signal.SIGKILL)
+    select.select([spawner._exit_status_socket], [], [], 5)
+    spawner._receive_exit_status()
+
+    # The process is reported as terminated, with an unknown exit status.
+    assert result == [None]
+    assert not spawner.running
+    assert spawner._exit_status_socket is None
+
+    os.close(master)
@@ -0,0 +1,52 @@
+from __future__ import unicode_literals
+
+from pymux.row import _CHAR_CACHE
+from pymux.screen import BetterScreen
+from pymux.stream import BetterStream
+from pymux.style import DEFAULT_ATTRS, StyleTable, style_table
+
+
+def _create_screen(history_limit):
+    screen = BetterScreen(10, 80, lambda data: None,
+                          get_history_limit=lambda: history_limit)
+    stream = BetterStream(screen)
+    stream.attach(screen)
+    return screen, stream
+
+
+def _feed_distinct_styles(stream, count):
+    " Feed `count` lines, all with a different true color style. "
+    for i in range(count):
+        stream.feed('\x1b[38;2;%i;%i;7mx\r\n' % (i % 256, i // 256))
+
+
+def test_unused_styles_are_freed():
+    screen, stream = _create_screen(history_limit=100)
+    _feed_distinct_styles(stream, 20000)
+
+    assert len(style_table) < 2 * style_table.min_collect_size
+    assert len(_CHAR_CACHE) <= _CHAR_CACHE.maxsize
+
+    # The styles that are in use didn't change.
+    row = screen.data_buffer[screen.pt_screen.cursor_position.y - 1]
+    assert row[0].token[1] == '%02x%02x07' % (19999 % 256, 19999 // 256)
+
+
+def test_styles_in_history_are_kept():
+    # The first row is compressed into the cold tier of the history.
+    screen, stream = _create_screen(history_limit=100000)
+    stream.feed('\x1b[38;2;1;2;3mkeep\x1b[0m\r\n')
+    token = screen.data_buffer[0][0].token
+
+    _feed_distinct_styles(stream, 20000)
+
+    assert screen.data_buffer._cold
+    assert screen.data_buffer[0][0].token == token
+
+
+def test_rendering_doesnt_add_styles():
+    table = StyleTable()
+    attrs = DEFAULT_ATTRS._replace(color='123456', bold=True)
+
+    assert table.get_attrs_for_token(('C', ) + attrs) == attrs
+    assert len(table) == 1
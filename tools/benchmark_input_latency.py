@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Benchmark for the input latency while panes are flooding their output.
+
+A few processes run `yes`, while another thread simulates a client that types
+a key every 20ms. We measure how long it takes before the event loop handles
+the key, with and without the `OutputScheduler`.
+
+Usage:
+    python tools/benchmark_input_latency.py [panes] [seconds]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prompt_toolkit.eventloop.callbacks import EventLoopCallbacks
+from prompt_toolkit.eventloop.posix import PosixEventLoop
+from prompt_toolkit.input import PipeInput
+
+from pymux.process import Process
+from pymux.scheduler import OutputScheduler
+
+
+class _DummyCallbacks(EventLoopCallbacks):
+    def terminal_size_changed(self): pass
+    def input_timeout(self): pass
+    def feed_key(self, key): pass
+
+
+def benchmark(panes, duration, use_scheduler):
+    eventloop = PosixEventLoop()
+    scheduler = OutputScheduler(eventloop) if use_scheduler else None
+    processes = []
+    latencies = []
+
+    for i in range(panes):
+        p = Process.from_command(eventloop, lambda: None, ['yes'], lambda: None,
+                                 scheduler=scheduler)
+        p.start()
+        processes.append(p)
+
+    # Simulated client: send the current time every 20ms.
+    client, server = socket.socketpair()
+    done = threading.Event()
+
+    def send_keys():
+        while not done.wait(.02):
+            client.send(struct.pack(str('d'), time.time()))
+
+    def receive_key():
+        data = server.recv(8 * 1024)
+        now = time.time()
+
+        for i in range(0, len(data) - 7, 8):
+            latencies.append(now - struct.unpack(str('d'), data[i:i + 8])[0])
+
+    def stop():
+        time.sleep(duration)
+        done.set()
+        eventloop.call_from_executor(eventloop.stop)
+
+    eventloop.add_reader(server.fileno(), receive_key)
+    threading.Thread(target=send_keys).start()
+    threading.Thread(target=stop).start()
+
+    start = time.time()
+    eventloop.run(PipeInput(), _DummyCallbacks())
+    elapsed = time.time() - start
+
+    lines = sum(p.screen.line_offset for p in processes)
+    for p in processes:
+        p.send_signal(9)
+
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[-1], lines / elapsed
+
+
+def main():
+    panes = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5.
+
+    for use_scheduler in (False, True):
+        median, maximum, lines = benchmark(panes, duration, use_scheduler)
+        print('%-20s latency: median %6.1fms, max %6.1fms  (%i lines/s)' % (
+            'scheduler' if use_scheduler else 'no scheduler',
+            median * 1000, maximum * 1000, lines))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for the parser: feed typical terminal output through a
+`BetterStream` into a `BetterScreen` and report the throughput.
+
+Usage:
+    python tools/benchmark_parser.py [megabytes]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pymux.screen import BetterScreen
+from pymux.stream import BetterStream
+
+#: Samples of terminal output: (name, text).
+SAMPLES = [
+    ('plain text', 'The quick brown fox jumps over the lazy dog. ' * 3 + '\r\n'),
+    ('colored text', '\x1b[1;32muser@host\x1b[0m:\x1b[1;34m~/src\x1b[0m$ ls -l\r\n'
+                     '\x1b[0m\x1b[01;34mdirectory\x1b[0m  \x1b[01;32mscript.sh\x1b[0m  file.txt\r\n'),
+    ('cursor movement', '\x1b[H\x1b[2J' + ''.join(
+        '\x1b[%i;1H\x1b[K%s' % (i, 'x' * 70) for i in range(1, 25))),
+    ('single characters', ''.join('%s\x08' % c for c in 'abcdefghijklmnop') + '\r\n'),
+]
+
+
+def benchmark(text, size):
+    screen = BetterScreen(24, 80, write_process_input=lambda data: None)
+    stream = BetterStream(screen)
+
+    # Feed in chunks, like the output of a process.
+    data = text * (size // len(text) + 1)
+    chunks = [data[i:i + 4096] for i in range(0, len(data), 4096)]
+
+    start = time.time()
+    for chunk in chunks:
+        stream.feed(chunk)
+    return time.time() - start
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 1.
+    size = int(megabytes * 1024 * 1024)
+
+    for name, text in SAMPLES:
+        duration = benchmark(text, size)
+        print('%-20s %8.3fs %8.2f MB/s' % (name, duration, megabytes / duration))
+
+
+if __name__ == '__main__':
+    main()
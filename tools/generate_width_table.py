@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Generate `pymux/width_table.py` from the `wcwidth` library.
+
+Usage:
+    python tools/generate_width_table.py > pymux/width_table.py
+"""
+from __future__ import unicode_literals, print_function
+from wcwidth import wcwidth
+
+import sys
+
+if sys.version_info[0] == 2:
+    chr = unichr
+
+MAX_CODE_POINT = 0x10ffff
+
+
+def get_ranges(width):
+    """
+    Return a list of (start, end) tuples (`end` inclusive) of the code points
+    that have this width. Control characters are treated as zero width.
+    """
+    ranges = []
+    start = None
+
+    for code_point in range(MAX_CODE_POINT + 2):
+        if code_point <= MAX_CODE_POINT and max(0, wcwidth(chr(code_point))) == width:
+            if start is None:
+                start = code_point
+        elif start is not None:
+            ranges.append((start, code_point - 1))
+            start = None
+
+    return ranges
+
+
+def format_ranges(name, ranges):
+    lines = ['%s = (' % name]
+    for start, end in ranges:
+        lines.append('    (0x%05x, 0x%05x),' % (start, end))
+    lines.append(')')
+    return '\n'.join(lines)
+
+
+def main():
+    print('"""')
+    print('Character width table, generated from wcwidth by')
+    print('`tools/generate_width_table.py`. Don\'t edit by hand.')
+    print('')
+    print('All code points that are not in one of these ranges are one cell wide.')
+    print('"""')
+    print('from __future__ import unicode_literals')
+    print('')
+    print('#: Ranges of code points (start and end inclusive) that take no space.')
+    print(format_ranges('ZERO_WIDTH_RANGES', get_ranges(0)))
+    print('')
+    print('#: Ranges of code points (start and end inclusive) that take two cells.')
+    print(format_ranges('WIDE_RANGES', get_ranges(2)))
+
+
+if __name__ == '__main__':
+    main()